@@ -1,12 +1,453 @@
+import array
+import collections
+import concurrent.futures
+import functools
+import itertools
+import json
+import multiprocessing
 import numpy as np
+import os
+import timeit
 import typing
 
+_ZOBRIST_MASK = (1 << 64) - 1
+_ZOBRIST_CELL, _ZOBRIST_HAND, _ZOBRIST_PLAYER_ON_TURN = 0, 1, 2
+#Number of positions searched between two checks of the stop event
+_STOP_CHECK_INTERVAL = 1024
+#Score of a won position in best_move, larger than any mobility evaluation
+_WIN_SCORE = 1 << 20
+#Kinds of scores in the table of best_move: the exact score, or a lower or upper bound
+_EXACT, _LOWER_BOUND, _UPPER_BOUND = 0, 1, 2
+
+
+@functools.lru_cache(maxsize=None)
+def _zobrist_key(*feature: int) -> int:
+    """
+    Returns the pseudo random 64 bit Zobrist key of a feature of a position.
+    The key is derived from the feature itself with the splitmix64 mixer, so
+    it is the same in every process.
+
+    :param feature: integers describing the feature, the first one being the
+    kind of feature
+    :return: the key of the feature
+    """
+    z = (hash(feature) + 0x9E3779B97F4A7C15) & _ZOBRIST_MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _ZOBRIST_MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _ZOBRIST_MASK
+    return z ^ (z >> 31)
+
+
+class TranspositionTable(object):
+
+    def __init__(self, max_size: int = 100000):
+        """
+        Stores the outcome of positions that were solved before, so positions
+        that are reached by different move orders are only solved once. When
+        the table is full, the least recently used position is evicted.
+        best_move stores its scores and best moves in a table of its own.
+
+        :param max_size: the maximum number of positions in the table
+        """
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: typing.Hashable) -> typing.Any:
+        """
+        Looks up the outcome of a position
+
+        :param key: the key of the position
+        :return: the stored outcome, None if the position is not in the table
+        """
+        outcome = self.entries.get(key)
+        if outcome is not None:
+            self.entries.move_to_end(key)
+        return outcome
+
+    def store(self, key: typing.Hashable, outcome: typing.Any) -> None:
+        """
+        Stores the outcome of a position, evicting the least recently used
+        position if the table is full
+
+        :param key: the key of the position
+        :param outcome: the outcome of the position
+        """
+        self.entries[key] = outcome
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes all positions from the table
+        """
+        self.entries.clear()
+
+
+class EndgameTablebase(object):
+    #Record of the table on disk: the Zobrist hash of a position and whether the player on turn wins
+    RECORD_DTYPE = np.dtype([('key', '<u8'), ('outcome', 'u1')])
+
+    def __init__(self, path: str, max_tiles: typing.Optional[int] = None):
+        """
+        Opens an endgame tablebase made by generate. The table is memory
+        mapped, positions are looked up with a binary search on the sorted
+        keys, so only the pages that are needed are read from the file. The
+        board and the tiles it was generated with are read from the header
+        next to it, see header_path.
+
+        :param path: the .npy file of the tablebase
+        :param max_tiles: the maximum number of tiles in a hand of the
+        positions in the table, positions with more tiles are not looked up.
+        All positions are looked up if not given
+        """
+        self.path = path
+        self.max_tiles = max_tiles
+        self.records = np.load(path, mmap_mode='r')
+        self.keys = self.records['key']
+        with open(self.header_path(path)) as header_file:
+            header = json.load(header_file)
+        #The Zobrist hash does not include the size of the board, the same tiles on a board of another
+        #size hash the same but can have another outcome, so only boards of this shape are looked up
+        self.board = np.array(header['board'])
+        self.tiles = set(tuple(tile) for tile in header['tiles'])
+
+    @staticmethod
+    def header_path(path: str) -> str:
+        """
+        :param path: the .npy file of a tablebase
+        :return: the .json file with the board and the tiles the tablebase
+        was generated with
+        """
+        return os.path.splitext(path)[0] + '.json'
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def covers(self, player_hand: typing.List[typing.Set[typing.Tuple[int, int, int, int]]],
+               board: np.ndarray) -> bool:
+        """
+        :param player_hand: the hands of both players
+        :param board: the board of the game, in the format of
+        Quatrominos.board
+        :return: true if positions with these hands on this board can be in
+        the table
+        """
+        if board.shape != self.board.shape:
+            return False
+        if self.max_tiles is not None and (len(player_hand[0]) > self.max_tiles or
+                                           len(player_hand[1]) > self.max_tiles):
+            return False
+        return all(tuple(int(value) for value in tile) in self.tiles for hand in player_hand for tile in hand)
+
+    def get(self, key: int) -> typing.Optional[bool]:
+        """
+        Looks up the outcome of a position
+
+        :param key: the Zobrist hash of the position, see
+        Quatrominos.position_key
+        :return: True iff the player on turn wins, None if the position is
+        not in the table
+        """
+        idx = int(np.searchsorted(self.keys, np.uint64(key)))
+        if idx < len(self.keys) and int(self.keys[idx]) == key:
+            return bool(self.records[idx]['outcome'])
+        return None
+
+    @classmethod
+    def generate(cls, path: str, board: np.ndarray, tiles: typing.List[typing.Tuple[int, int, int, int]],
+                 max_tiles: int, deal_tiles: typing.Optional[int] = None,
+                 max_positions: int = 10000000) -> 'EndgameTablebase':
+        """
+        Enumerates the positions that can be reached from the board when each
+        player is dealt at most deal_tiles of the given tiles, with both
+        players starting, and stores the outcome of all of them where each
+        hand holds at most max_tiles tiles. The positions are keyed by their
+        Zobrist hash, so they are only found for hands that store the tiles in
+        the same orientation as given here.
+
+        :param path: the .npy file to write the tablebase to, the board and
+        the tiles are written to the .json file next to it
+        :param board: the board with the frontier shape the games start from,
+        in the format of Quatrominos.board
+        :param tiles: the tiles the hands are drawn from, a tile may end up
+        in both hands
+        :param max_tiles: the maximum number of tiles in a hand of the stored
+        positions
+        :param deal_tiles: the maximum number of tiles dealt to a player, at
+        least max_tiles, max_tiles if not given
+        :param max_positions: the maximum number of positions in the
+        transposition table used while solving
+        :return: the tablebase, opened from the file
+        """
+        if deal_tiles is None:
+            deal_tiles = max_tiles
+        transposition_table = TranspositionTable(max_positions)
+        outcomes, visited = dict(), set()
+        hands = [hand for n_tiles in range(deal_tiles + 1) for hand in itertools.combinations(tiles, n_tiles)]
+        for player0, player1 in itertools.product(hands, repeat=2):
+            for player_on_turn in range(2):
+                game_state = Quatrominos(set(player0), set(player1), np.copy(board), player_on_turn,
+                                         transposition_table)
+                game_state.position_hash = game_state.position_key()
+                game_state._start_tracking()
+                try:
+                    cls._collect_outcomes(game_state, max_tiles, outcomes, visited)
+                finally:
+                    game_state._stop_tracking()
+
+        records = np.empty(len(outcomes), dtype=cls.RECORD_DTYPE)
+        records['key'] = np.fromiter(outcomes.keys(), dtype=np.uint64, count=len(records))
+        records['outcome'] = np.fromiter(outcomes.values(), dtype=np.uint8, count=len(records))
+        records.sort(order='key')
+        np.save(path, records)
+        with open(cls.header_path(path), 'w') as header_file:
+            json.dump({'board': np.asarray(board).tolist(), 'tiles': [list(tile) for tile in tiles],
+                       'max_tiles': max_tiles}, header_file)
+        return cls(path, max_tiles)
+
+    @staticmethod
+    def _collect_outcomes(game_state: 'Quatrominos', max_tiles: int, outcomes: typing.Dict[int, bool],
+                          visited: typing.Set[int]) -> None:
+        """
+        Visits every position reachable from the position the game is in,
+        solving the ones where each hand holds at most max_tiles tiles
+
+        :param game_state: the game, with its position hash up to date
+        :param max_tiles: the maximum number of tiles in a hand of the solved
+        positions
+        :param outcomes: maps the hash of the solved positions to whether the
+        player on turn wins
+        :param visited: the hashes of the positions visited before
+        """
+        if game_state.position_hash in visited:
+            return
+        visited.add(game_state.position_hash)
+        if max(len(hand) for hand in game_state.player_hand) <= max_tiles:
+            outcomes[game_state.position_hash] = game_state._current_player_can_win_cached()
+        if game_state.check_current_player_lost():
+            return
+        for move in game_state.legal_moves():
+            game_state.apply_move(*move)
+            try:
+                EndgameTablebase._collect_outcomes(game_state, max_tiles, outcomes, visited)
+            finally:
+                game_state.undo_move(*move)
+
+
+class SearchAborted(Exception):
+    """
+    Raised by the searches of Quatrominos when their stop event is set
+    """
+    pass
+
+
+class CompactBoard(object):
+
+    def __init__(self, height: int, width: int,
+                 tiles: typing.Iterable[typing.Tuple[int, int, int, int]] = ()):
+        """
+        Compact representation of a Quatrominos board: every position holds
+        the id of the tile in its orientation, and the occupied positions and
+        the frontier (vacant positions next to a tile) are bitboards, where
+        position (y, x) is bit y * width + x.
+
+        :param height: the number of rows of the board
+        :param width: the number of columns of the board
+        :param tiles: the tiles in their orientations that get the first ids,
+        e.g. every orientation of the tiles in the hands
+        """
+        self.height = height
+        self.width = width
+        #Every board interns its own tiles to small integer ids, so the ids only cover the tiles
+        #of one game. Id 0 is the vacant position, so the numbers on its edges read as -1 like on the board
+        self._tiles = [(-1, -1, -1, -1)]
+        self._tile_ids = {(-1, -1, -1, -1): 0}
+        for tile in tiles:
+            self.tile_id(tuple(int(value) for value in tile))
+        self.cells = array.array('i', [0]) * (height * width)
+        self.occupied = 0
+        self.frontier = 0
+        board_mask = (1 << (height * width)) - 1
+        first_column = sum(1 << (board_y * width) for board_y in range(height))
+        self._board_mask = board_mask
+        self._not_first_column = board_mask & ~first_column
+        self._not_last_column = board_mask & ~(first_column << (width - 1))
+
+    def tile_id(self, tile: typing.Tuple[int, int, int, int]) -> int:
+        """
+        Returns the id of a tile in its orientation, a new id is given to
+        tiles that were not seen before
+
+        :param tile: the tile
+        :return: the id of the tile
+        """
+        tile_id = self._tile_ids.get(tile)
+        if tile_id is None:
+            tile_id = self._tile_ids[tile] = len(self._tiles)
+            self._tiles.append(tile)
+        return tile_id
+
+    def tile(self, tile_id: int) -> typing.Tuple[int, int, int, int]:
+        """
+        :param tile_id: the id of a tile
+        :return: the tile with that id
+        """
+        return self._tiles[tile_id]
+
+    def hand_bits(self, tiles: typing.Iterable[typing.Tuple[int, int, int, int]]) -> int:
+        """
+        Converts a hand to a bitset of tile ids
+
+        :param tiles: the tiles in the hand
+        :return: the bitset with bit tile_id set for every tile in the hand
+        """
+        bits = 0
+        for tile in tiles:
+            bits |= 1 << self.tile_id(tuple(int(value) for value in tile))
+        return bits
+
+    def hand_tiles(self, bits: int) -> typing.Set[typing.Tuple[int, int, int, int]]:
+        """
+        Converts a bitset of tile ids made by hand_bits back to a hand
+
+        :param bits: the bitset of tile ids
+        :return: the set of tiles
+        """
+        tiles = set()
+        while bits:
+            lowest_bit = bits & -bits
+            tiles.add(self._tiles[lowest_bit.bit_length() - 1])
+            bits ^= lowest_bit
+        return tiles
+
+    @classmethod
+    def from_board(cls, board: np.ndarray,
+                   tiles: typing.Iterable[typing.Tuple[int, int, int, int]] = ()) -> 'CompactBoard':
+        """
+        Converts a board in the format of Quatrominos.board
+
+        :param board: 3D numpy array, -1 for vacant positions
+        :param tiles: the tiles in their orientations that get the first ids
+        :return: the compact board
+        """
+        compact_board = cls(board.shape[0], board.shape[1], tiles)
+        for board_y, board_x in zip(*np.nonzero(board[:, :, 0] != -1)):
+            compact_board.place(int(board_y), int(board_x), tuple(int(value) for value in board[board_y, board_x]))
+        return compact_board
+
+    def to_board(self) -> np.ndarray:
+        """
+        Converts the compact board to the format of Quatrominos.board
+
+        :return: 3D numpy array, -1 for vacant positions
+        """
+        tiles = np.array(self._tiles)
+        return tiles[np.frombuffer(self.cells, dtype=np.intc)].reshape(self.height, self.width, 4)
+
+    def place(self, board_y: int, board_x: int, tile: typing.Tuple[int, int, int, int]) -> None:
+        """
+        Puts a tile on a vacant position
+
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        :param tile: the tile in its orientation on the board
+        """
+        position = board_y * self.width + board_x
+        self.cells[position] = self.tile_id(tile)
+        self.occupied |= 1 << position
+        self._update_frontier()
+
+    def clear(self, board_y: int, board_x: int) -> None:
+        """
+        Takes the tile from a position
+
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        """
+        position = board_y * self.width + board_x
+        self.cells[position] = 0
+        self.occupied &= ~(1 << position)
+        self._update_frontier()
+
+    def _update_frontier(self) -> None:
+        """
+        Computes the frontier from the occupied positions, by shifting the
+        occupied bitboard one position in every direction
+        """
+        occupied, width = self.occupied, self.width
+        neighbours = ((occupied << width) | (occupied >> width) |
+                      ((occupied & self._not_last_column) << 1) | ((occupied & self._not_first_column) >> 1))
+        self.frontier = neighbours & self._board_mask & ~occupied
+
+    def in_frontier(self, board_y: int, board_x: int) -> bool:
+        """
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        :return: true if the position is vacant and next to a tile
+        """
+        return (self.frontier >> (board_y * self.width + board_x)) & 1 == 1
+
+    def frontier_locations(self) -> typing.List[typing.Tuple[int, int]]:
+        """
+        :return: list of the (y, x) coordinates in the frontier
+        """
+        locations = list()
+        frontier = self.frontier
+        while frontier:
+            lowest_bit = frontier & -frontier
+            locations.append(divmod(lowest_bit.bit_length() - 1, self.width))
+            frontier ^= lowest_bit
+        return locations
+
+    def edge_constraint(self, board_y: int, board_x: int) -> typing.Tuple[int, int, int, int]:
+        """
+        Returns the edge constraint of a position like
+        Quatrominos.edge_constraint
+
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        :return: the edge constraint of the position
+        """
+        cells, tiles, width = self.cells, self._tiles, self.width
+        position = board_y * width + board_x
+        return (tiles[cells[position - width]][2] if board_y > 0 else -1,
+                tiles[cells[position + 1]][3] if board_x + 1 < width else -1,
+                tiles[cells[position + width]][0] if board_y + 1 < self.height else -1,
+                tiles[cells[position - 1]][1] if board_x > 0 else -1)
+
+
+class _ProofNumberNode(object):
+    """
+    Node of the tree of Quatrominos.current_player_can_win_proof_number. The
+    node is an OR node if the player on turn at the root is on turn in it,
+    an AND node otherwise.
+    """
+    __slots__ = ('move', 'parent', 'is_or_node', 'position_hash', 'moves',
+                 'children', 'proof', 'disproof')
+
+    def __init__(self, move, parent, is_or_node: bool, position_hash: int):
+        self.move = move
+        self.parent = parent
+        self.is_or_node = is_or_node
+        self.position_hash = position_hash
+        self.moves = None
+        self.children = None
+        self.proof = 1
+        self.disproof = 1
+
+
 class Quatrominos(object):
 
     def __init__(self, player0: typing.Set[typing.Tuple[int, int, int, int]],
                  player1: typing.Set[typing.Tuple[int, int, int, int]],
                  board: np.ndarray,
-                 player_on_turn: int):
+                 player_on_turn: int,
+                 transposition_table: typing.Optional[TranspositionTable] = None,
+                 compact: bool = False,
+                 tablebase: typing.Optional[EndgameTablebase] = None):
         """
         Initializes the game board, and divides the tiles among both players.
         Each tile is represented as a 1d numpy array, consisting of exactly
@@ -23,10 +464,40 @@ class Quatrominos(object):
         respectively, and the third dimension is of size 4, representing a
         tile.
         :param player_on_turn: 0 iff player 0 is on turn, 1 otherwise
+        :param transposition_table: the table with the outcomes of solved
+        positions used by current_player_can_win, a new table is made if not
+        given
+        :param compact: if True, searches keep a CompactBoard next to the
+        board, from which moves are generated
+        :param tablebase: the endgame tablebase current_player_can_win looks
+        up positions in that are not in the transposition table
         """
         self.player_hand = [player0, player1]
         self.board = board
         self.player_on_turn = player_on_turn
+        if transposition_table is None:
+            transposition_table = TranspositionTable()
+        self.transposition_table = transposition_table
+        self.tablebase = tablebase
+        #Zobrist hash of the position, set by position_key and updated for every move of the search
+        self.position_hash = None
+        #While searching, the vacant positions adjacent to a tile and the number of tiles on the
+        #board are kept up to date by apply_move and undo_move, None otherwise
+        self.frontier = None
+        self.n_occupied = None
+        #While searching, move_index[player] maps edge constraints to the moves of that player's tiles
+        self.move_index = None
+        self._tracking_depth = 0
+        #While searching with compact=True, the CompactBoard replaces the frontier
+        self.compact = compact
+        self.compact_board = None
+        #Number of positions searched by the search methods, current_player_can_win raises SearchAborted
+        #once stop_event (threading.Event or multiprocessing.Event) is set
+        self.nodes_searched = 0
+        self.stop_event = None
+        #While searching with symmetric=True, the Zobrist hashes of the position under every
+        #symmetry of the board, kept up to date by apply_move and undo_move, None otherwise
+        self.symmetry_hashes = None
         
     def print_current_state(self) -> None:
         """
@@ -84,6 +555,93 @@ class Quatrominos(object):
             rotations = rotations - 1
         return tile
 
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def unique_rotations(tile: typing.Tuple[int, int, int, int]
+                         ) -> typing.Tuple[typing.Tuple[typing.Tuple[int, int, int, int], int], ...]:
+        """
+        Returns the different orientations of a tile, a tile like (1, 2, 1, 2)
+        has only two different orientations and (2, 2, 2, 2) only one.
+
+        :param tile: the tile to rotate
+        :return: tuple of pairs of an orientation and the number of the four
+        rotations that give it
+        """
+        rotations = collections.Counter(Quatrominos.get_rotated_tile(tile, rotation) for rotation in range(4))
+        return tuple(rotations.items())
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def constraint_patterns(tile: typing.Tuple[int, int, int, int]
+                            ) -> typing.Tuple[typing.Tuple[int, int, int, int], ...]:
+        """
+        Returns all edge constraints a tile satisfies in its orientation: for
+        each subset of its edges, the tile with the other edges replaced by -1
+        (unconstrained).
+
+        :param tile: the tile in its orientation
+        :return: the 16 edge constraints the tile satisfies
+        """
+        return tuple(tuple(tile[edge] if (edges >> edge) & 1 else -1 for edge in range(4))
+                     for edges in range(16))
+
+    def edge_constraint(self, board_y: int, board_x: int) -> typing.Tuple[int, int, int, int]:
+        """
+        Returns the numbers a tile must have on its north, east, south and west
+        edge to fit between the neighbours of a position, -1 where there is no
+        neighbouring tile
+
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        :return: the edge constraint of the position
+        """
+        if self.compact_board is not None:
+            return self.compact_board.edge_constraint(board_y, board_x)
+        #Vacant positions hold -1, so only positions off the board need checking
+        board = self.board
+        return (board.item(board_y-1, board_x, 2) if board_y > 0 else -1,
+                board.item(board_y, board_x+1, 3) if board_x + 1 < board.shape[1] else -1,
+                board.item(board_y+1, board_x, 0) if board_y + 1 < board.shape[0] else -1,
+                board.item(board_y, board_x-1, 1) if board_x > 0 else -1)
+
+    @staticmethod
+    def build_move_index(tiles: typing.Iterable[typing.Tuple[int, int, int, int]]) -> typing.Dict:
+        """
+        Builds the move index of a hand: for every edge constraint, the tiles
+        and orientations that satisfy it
+
+        :param tiles: the tiles in the hand
+        :return: dictionary from edge constraint to a list of (tile,
+        orientation, number of rotations giving that orientation)
+        """
+        move_index = dict()
+        for tile in tiles:
+            for rotated_tile, n_rotations in Quatrominos.unique_rotations(tile):
+                for pattern in Quatrominos.constraint_patterns(rotated_tile):
+                    move_index.setdefault(pattern, list()).append((tile, rotated_tile, n_rotations))
+        return move_index
+
+    def legal_moves(self) -> typing.List[typing.Tuple[int, int, typing.Tuple[int, int, int, int],
+                                                      typing.Tuple[int, int, int, int]]]:
+        """
+        Enumerates the moves of the player on turn, each orientation of a tile
+        only once, by looking up the edge constraint of every adjacent location
+        in the move index of the player.
+
+        :return: list of (y, x, tile, rotated_tile), where tile is the tile as
+        it is stored in the hand and rotated_tile its orientation on (y, x)
+        """
+        self._start_tracking()
+        try:
+            hand = self.player_hand[self.player_on_turn]
+            move_index = self.move_index[self.player_on_turn]
+            return [(board_y, board_x, tile, rotated_tile)
+                    for board_y, board_x in self.adjacent_locations()
+                    for tile, rotated_tile, _ in move_index.get(self.edge_constraint(board_y, board_x), ())
+                    if tile in hand]
+        finally:
+            self._stop_tracking()
+
     def adjacent_locations(self) -> typing.Set[typing.Tuple[int, int]]:
         """
         Returns a set with tuples of (y,x)-coordinates where we could
@@ -93,6 +651,10 @@ class Quatrominos(object):
         :return: a set with tuples of (y,x)-coordinates of vacant positions
         adjacent to non-vacant positions
         """
+        if self.compact_board is not None and self.n_occupied > 0:
+            return set(self.compact_board.frontier_locations())
+        if self.frontier is not None and self.n_occupied > 0: #the frontier is kept up to date while searching
+            return set(self.frontier)
         adjacent_vacant_positions = set()
         for row in range(len(self.board)):#row position
             for column in range(len(self.board[row])):#column position
@@ -137,9 +699,87 @@ class Quatrominos(object):
             adjacent_vacant_positions.add((mid_row_board,mid_column_board))
         return adjacent_vacant_positions
 
+    def _is_adjacent_location(self, board_y: int, board_x: int) -> bool:
+        """
+        Checks whether a position is one of the adjacent_locations, with a
+        single lookup in the frontier while searching
+
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        :return: true if the position is in adjacent_locations()
+        """
+        if self.compact_board is not None and self.n_occupied > 0:
+            return self.compact_board.in_frontier(board_y, board_x)
+        if self.frontier is not None and self.n_occupied > 0:
+            return (board_y, board_x) in self.frontier
+        return (board_y, board_x) in self.adjacent_locations()
+
+    def _neighbours(self, board_y: int, board_x: int) -> typing.Iterator[typing.Tuple[int, int]]:
+        """
+        Yields the positions north, south, west and east of a position that are
+        on the board
+
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        """
+        if board_y > 0:
+            yield board_y - 1, board_x
+        if board_y + 1 < len(self.board):
+            yield board_y + 1, board_x
+        if board_x > 0:
+            yield board_y, board_x - 1
+        if board_x + 1 < len(self.board[0]):
+            yield board_y, board_x + 1
+
+    def _has_occupied_neighbour(self, board_y: int, board_x: int) -> bool:
+        """
+        Checks whether a tile lies north, south, west or east of a position
+
+        :param board_y: board y index of the position
+        :param board_x: board x index of the position
+        :return: true if one of the neighbouring positions holds a tile
+        """
+        for neighbour_y, neighbour_x in self._neighbours(board_y, board_x):
+            if self.board[neighbour_y, neighbour_x, 0] != -1:
+                return True
+        return False
+
+    def _start_tracking(self) -> None:
+        """
+        Builds the frontier and the number of tiles on the board from the
+        board, after which apply_move and undo_move keep them up to date.
+        Calls can be nested, only the outermost call builds them.
+        """
+        self._tracking_depth += 1
+        if self._tracking_depth == 1:
+            if self.compact:
+                orientations = [rotated_tile for hand in self.player_hand for tile in hand
+                                for rotated_tile, _ in self.unique_rotations(tile)]
+                self.compact_board = CompactBoard.from_board(self.board, orientations)
+            else:
+                self.frontier = set(self.adjacent_locations()) if not self.boardisempty() else set()
+            self.n_occupied = int(np.count_nonzero(self.board[:, :, 0] != -1))
+            #Tiles only leave and return to the hands while searching, so the index of the
+            #hands now covers every later hand, tiles that left the hand are skipped on lookup
+            self.move_index = [self.build_move_index(hand) for hand in self.player_hand]
+
+    def _stop_tracking(self) -> None:
+        """
+        Stops keeping the frontier up to date, the outermost call discards it
+        so direct changes to the board are picked up again
+        """
+        self._tracking_depth -= 1
+        if self._tracking_depth == 0:
+            self.compact_board = None
+            self.frontier = None
+            self.n_occupied = None
+            self.move_index = None
+
     def boardisempty(self) -> bool:
         """Checks wether the board is empty
         :return: true if the board is empty, false otherwise"""
+        if self.n_occupied is not None:
+            return self.n_occupied == 0
         for row in range(len(self.board)):
             for column in range(len(self.board[row])):
                 for value in range(len(self.board[row][column])):
@@ -162,7 +802,7 @@ class Quatrominos(object):
         """
         if self.boardisempty(): #if board is empty the tile can be placed
             return True
-        elif self.boardisempty() == False and (board_y,board_x) in self.adjacent_locations(): #checks the tile is in adjacent locations (and can be placed adjacent to a tile)
+        elif self.boardisempty() == False and self._is_adjacent_location(board_y, board_x): #checks the tile is in adjacent locations (and can be placed adjacent to a tile)
             if (board_y - 1) in range(len(self.board)) and self.board[board_y-1][board_x][2] != -1:
                 if self.board[board_y-1][board_x][2] != tile[0]:
                     return False
@@ -176,7 +816,7 @@ class Quatrominos(object):
                 if self.board[board_y][board_x+1][3] != tile[1]:
                     return False
             return True
-        elif self.boardisempty and (board_y,board_x) not in self.adjacent_locations():
+        elif self.boardisempty and not self._is_adjacent_location(board_y, board_x):
             return False
         else:
             return True
@@ -190,17 +830,50 @@ class Quatrominos(object):
         :param tiles: A numpy array with the tiles
         :return: The number of moves a player can make
         """
-        set_of_options = list()
-        number_of_available_moves = 0
-        for tile in tiles:
-            for rotation in range(4): 
-                set_of_options.append(self.get_rotated_tile(tile,rotation))
+        if self.move_index is not None:
+            for player in range(2):
+                if tiles is self.player_hand[player]: #Look up the moves of a hand in its move index
+                    move_index = self.move_index[player]
+                    return sum(n_rotations
+                               for board_y, board_x in self.adjacent_locations()
+                               for tile, _, n_rotations in move_index.get(self.edge_constraint(board_y, board_x), ())
+                               if tile in tiles)
+        if len(tiles) == 0:
+            return 0
+        #Compare the edge constraints of all adjacent locations with all orientations of all tiles at once
+        orientations = self.orientations_array(tiles)
+        constraints = self.frontier_constraints()[:, None, :]
+        fits = ((constraints == -1) | (constraints == orientations[None, :, :])).all(axis=-1)
+        return int(np.count_nonzero(fits))
+
+    @staticmethod
+    def orientations_array(tiles: typing.Iterable[typing.Tuple[int, int, int, int]]) -> np.array:
+        """
+        Returns the four rotations of every tile, a tile that looks the same
+        after a rotation has that orientation more than once
+
+        :param tiles: the tiles
+        :return: 2D numpy array with 4 rows per tile, one orientation per row
+        """
+        return np.array([Quatrominos.get_rotated_tile(tuple(tile), rotation)
+                         for tile in tiles for rotation in range(4)]).reshape(-1, 4)
+
+    def frontier_constraints(self) -> np.array:
+        """
+        Determines the edge constraint of all adjacent_locations at once, by
+        shifting the board one position in every direction
 
-        for option in set_of_options:
-            for position in self.adjacent_locations():
-                if self.can_place_given_tile(position[0],position[1],option) == True:
-                    number_of_available_moves += 1
-        return number_of_available_moves
+        :return: 2D numpy array with the edge constraint of one adjacent
+        location per row, in row major order
+        """
+        board = self.board
+        occupied = board[:, :, 0] != -1
+        if not occupied.any(): #the first tile can be placed on the middle position in any orientation
+            return np.full((1, 4), -1)
+        padded = np.pad(board, ((1, 1), (1, 1), (0, 0)), constant_values=-1)
+        constraints = np.stack((padded[:-2, 1:-1, 2], padded[1:-1, 2:, 3],
+                                padded[2:, 1:-1, 0], padded[1:-1, :-2, 1]), axis=-1)
+        return constraints[~occupied & (constraints != -1).any(axis=-1)]
 
     def check_current_player_lost(self) -> bool:
         """
@@ -219,8 +892,268 @@ class Quatrominos(object):
             return True
         else:
             return False
+
+    def check_current_player_won(self) -> bool:
+        """
+        Determines whether the player that is currently on turn has won the
+        game, by having played all their tiles. The player then has no moves
+        left, but unlike in check_current_player_lost that ends the game in
+        their favour. Every search ends in such a position the same way.
+
+        :return: True iff the current player has won, False otherwise
+        """
+        return len(self.player_hand[self.player_on_turn]) == 0
     
-    def current_player_can_win(self) -> bool:
+    @staticmethod
+    def zobrist_cell(board_y: int, board_x: int, tile: typing.Tuple[int, int, int, int]) -> int:
+        """
+        Returns the Zobrist key of a tile lying on the board
+
+        :param board_y: board y index of the tile
+        :param board_x: board x index of the tile
+        :param tile: the tile in its orientation on the board
+        :return: the key of the tile on that position
+        """
+        return _zobrist_key(_ZOBRIST_CELL, board_y, board_x, *tile)
+
+    @staticmethod
+    def zobrist_hand(player: int, tile: typing.Tuple[int, int, int, int]) -> int:
+        """
+        Returns the Zobrist key of a tile in the hand of a player
+
+        :param player: the player holding the tile
+        :param tile: the tile as it is stored in the hand
+        :return: the key of the tile in that hand
+        """
+        return _zobrist_key(_ZOBRIST_HAND, player, *tile)
+
+    def position_key(self) -> int:
+        """
+        Computes the Zobrist hash of the current position from scratch: the
+        exclusive or of the keys of all tiles on the board, all tiles in the
+        hands and the player on turn. Two game states with the same board, the
+        same hands and the same player on turn have the same hash.
+
+        :return: the hash of the current position
+        """
+        position_hash = _zobrist_key(_ZOBRIST_PLAYER_ON_TURN) if self.player_on_turn == 1 else 0
+        for board_y, board_x in zip(*np.nonzero(self.board[:, :, 0] != -1)):
+            position_hash ^= self.zobrist_cell(int(board_y), int(board_x),
+                                               tuple(int(value) for value in self.board[board_y, board_x]))
+        for player in range(2):
+            for tile in self.player_hand[player]:
+                position_hash ^= self.zobrist_hand(player, tile)
+        return position_hash
+
+    def move_hash(self, board_y: int, board_x: int, tile: typing.Tuple[int, int, int, int],
+                  rotated_tile: typing.Tuple[int, int, int, int]) -> int:
+        """
+        Returns the change of the Zobrist hash when the player on turn plays a
+        tile from their hand, the hash after the move is the exclusive or of
+        the hash before the move and this change. Undoing the move changes the
+        hash by the same value.
+
+        :param board_y: board y index to place the tile
+        :param board_x: board x index to place the tile
+        :param tile: the tile as it is stored in the hand
+        :param rotated_tile: the tile in the orientation it is placed in
+        :return: the change of the hash
+        """
+        return (self.zobrist_cell(board_y, board_x, rotated_tile) ^
+                self.zobrist_hand(self.player_on_turn, tile) ^
+                _zobrist_key(_ZOBRIST_PLAYER_ON_TURN))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def board_symmetries(height: int, width: int) -> typing.Tuple[typing.Tuple[int, bool], ...]:
+        """
+        Returns the symmetries of a board of the given size: a square board
+        has the 8 symmetries of the dihedral group, other boards only the
+        identity, the half turn and the two mirrorings.
+
+        :param height: the number of rows of the board
+        :param width: the number of columns of the board
+        :return: tuple of (number of clockwise quarter turns, mirrored), a
+        mirrored symmetry mirrors the board left to right before turning it
+        """
+        return tuple((n_rotations, mirrored) for mirrored in (False, True) for n_rotations in range(4)
+                     if height == width or n_rotations % 2 == 0)
+
+    @staticmethod
+    def transform_location(board_y: int, board_x: int, height: int, width: int,
+                           symmetry: typing.Tuple[int, bool]) -> typing.Tuple[int, int]:
+        """
+        Returns where a location of the board ends up under a symmetry
+
+        :param board_y: board y index of the location
+        :param board_x: board x index of the location
+        :param height: the number of rows of the board
+        :param width: the number of columns of the board
+        :param symmetry: (number of clockwise quarter turns, mirrored)
+        :return: the transformed (y, x)
+        """
+        n_rotations, mirrored = symmetry
+        if mirrored:
+            board_x = width - 1 - board_x
+        for _ in range(n_rotations):
+            board_y, board_x, height, width = board_x, height - 1 - board_y, width, height
+        return board_y, board_x
+
+    @staticmethod
+    def transform_tile(tile: typing.Tuple[int, int, int, int],
+                       symmetry: typing.Tuple[int, bool]) -> typing.Tuple[int, int, int, int]:
+        """
+        Returns a tile on the board as it looks after a symmetry of the board:
+        the tile turns along with the board, and mirroring swaps its east and
+        west number.
+
+        :param tile: the tile in its orientation on the board
+        :param symmetry: (number of clockwise quarter turns, mirrored)
+        :return: the transformed tile
+        """
+        n_rotations, mirrored = symmetry
+        if mirrored:
+            tile = (tile[0], tile[3], tile[2], tile[1])
+        return Quatrominos.get_rotated_tile(tile, n_rotations)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def canonical_tile(tile: typing.Tuple[int, int, int, int]) -> typing.Tuple[int, int, int, int]:
+        """
+        Returns the representative of all orientations of a tile, the smallest
+        of them. Tiles in a hand can be played in every orientation, so a hand
+        only depends on the canonical tiles in it.
+
+        :param tile: the tile in any orientation
+        :return: the smallest orientation of the tile
+        """
+        return min(rotated_tile for rotated_tile, _ in Quatrominos.unique_rotations(tile))
+
+    def canonical_form(self) -> typing.Tuple[np.ndarray, typing.Tuple[typing.Tuple[int, int, int, int], ...],
+                                             typing.Tuple[typing.Tuple[int, int, int, int], ...]]:
+        """
+        Maps the board and the hands to the representative of all positions
+        that are equivalent under the symmetries of the board: the image with
+        the smallest board. Equivalent positions have the same canonical form,
+        the player on turn is not part of it.
+
+        :return: the transformed board, and the hands of player 0 and player 1
+        as sorted tuples of canonical tiles
+        """
+        best_form, best_key = None, None
+        height, width = self.board.shape[:2]
+        for n_rotations, mirrored in self.board_symmetries(height, width):
+            board = self.board
+            if mirrored:
+                board = board[:, ::-1, [0, 3, 2, 1]]
+            #A clockwise quarter turn of the board turns every tile clockwise too
+            board = np.rot90(board, k=-n_rotations, axes=(0, 1))[:, :, [(edge - n_rotations) % 4 for edge in range(4)]]
+            hands = tuple(tuple(sorted(self.canonical_tile(self.transform_tile(tile, (0, mirrored)))
+                                       for tile in hand)) for hand in self.player_hand)
+            key = (board.tobytes(), hands)
+            if best_key is None or key < best_key:
+                best_form, best_key = (np.ascontiguousarray(board),) + hands, key
+        return best_form
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def symmetric_cell_keys(board_y: int, board_x: int, tile: typing.Tuple[int, int, int, int],
+                            height: int, width: int) -> typing.Tuple[int, ...]:
+        """
+        Returns the Zobrist key of a tile on the board in every image of the
+        board under board_symmetries
+
+        :param board_y: board y index of the tile
+        :param board_x: board x index of the tile
+        :param tile: the tile in its orientation on the board
+        :param height: the number of rows of the board
+        :param width: the number of columns of the board
+        :return: the keys, in the order of board_symmetries
+        """
+        return tuple(Quatrominos.zobrist_cell(*Quatrominos.transform_location(board_y, board_x, height, width, symmetry),
+                                              Quatrominos.transform_tile(tile, symmetry))
+                     for symmetry in Quatrominos.board_symmetries(height, width))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def symmetric_hand_keys(player: int, tile: typing.Tuple[int, int, int, int],
+                            height: int, width: int) -> typing.Tuple[int, ...]:
+        """
+        Returns the Zobrist key of a tile in a hand in every image of the
+        position under board_symmetries, mirrored images hold the mirrored tile
+
+        :param player: the player holding the tile
+        :param tile: the tile as it is stored in the hand
+        :param height: the number of rows of the board
+        :param width: the number of columns of the board
+        :return: the keys, in the order of board_symmetries
+        """
+        return tuple(Quatrominos.zobrist_hand(player, Quatrominos.canonical_tile(
+                         Quatrominos.transform_tile(tile, (0, mirrored))))
+                     for _, mirrored in Quatrominos.board_symmetries(height, width))
+
+    def symmetric_position_keys(self) -> typing.List[int]:
+        """
+        Computes the Zobrist hash of every image of the current position under
+        board_symmetries from scratch. The smallest of them is the same for all
+        equivalent positions.
+
+        :return: list of hashes, in the order of board_symmetries
+        """
+        height, width = self.board.shape[:2]
+        player_key = _zobrist_key(_ZOBRIST_PLAYER_ON_TURN) if self.player_on_turn == 1 else 0
+        position_hashes = [player_key] * len(self.board_symmetries(height, width))
+        features = [self.symmetric_cell_keys(int(board_y), int(board_x),
+                                             tuple(int(value) for value in self.board[board_y, board_x]),
+                                             height, width)
+                    for board_y, board_x in zip(*np.nonzero(self.board[:, :, 0] != -1))]
+        features += [self.symmetric_hand_keys(player, tile, height, width)
+                     for player in range(2) for tile in self.player_hand[player]]
+        for keys in features:
+            position_hashes = [position_hash ^ key for position_hash, key in zip(position_hashes, keys)]
+        return position_hashes
+
+    def _update_symmetry_hashes(self, board_y: int, board_x: int, tile: typing.Tuple[int, int, int, int],
+                                rotated_tile: typing.Tuple[int, int, int, int]) -> None:
+        """
+        Changes symmetry_hashes by a move of the player on turn, like
+        move_hash does for the position hash. Undoing the move changes them
+        by the same values.
+
+        :param board_y: board y index to place the tile
+        :param board_x: board x index to place the tile
+        :param tile: the tile as it is stored in the hand
+        :param rotated_tile: the tile in the orientation it is placed in
+        """
+        height, width = self.board.shape[:2]
+        player_key = _zobrist_key(_ZOBRIST_PLAYER_ON_TURN)
+        self.symmetry_hashes = [
+            position_hash ^ cell_key ^ hand_key ^ player_key for position_hash, cell_key, hand_key in zip(
+                self.symmetry_hashes, self.symmetric_cell_keys(board_y, board_x, rotated_tile, height, width),
+                self.symmetric_hand_keys(self.player_on_turn, tile, height, width))]
+
+    def distinct_moves(self, moves: typing.List[typing.Tuple[int, int, typing.Tuple[int, int, int, int],
+                                                             typing.Tuple[int, int, int, int]]]
+                       ) -> typing.List[typing.Tuple[int, int, typing.Tuple[int, int, int, int],
+                                                     typing.Tuple[int, int, int, int]]]:
+        """
+        Removes moves that lead to a position equivalent to the position after
+        an earlier move, under the symmetries of the board
+
+        :param moves: list of (y, x, tile, rotated_tile) of the player on turn
+        :return: the first move of every class of equivalent moves, in order
+        """
+        distinct, seen = list(), set()
+        for move in moves:
+            self.apply_move(*move)
+            key = min(self.symmetric_position_keys())
+            self.undo_move(*move)
+            if key not in seen:
+                seen.add(key)
+                distinct.append(move)
+        return distinct
+
+    def current_player_can_win(self, symmetric: bool = False) -> bool:
         """
         Uses a exhaustive search algorithm to determine which player will win,
         if both players adopt an optimal strategy. Use a recursive function.
@@ -228,39 +1161,425 @@ class Quatrominos(object):
         Ensure that after this function, all class variables that were changed
         are set back to their original values.
 
+        Positions that were solved before are looked up in the transposition
+        table, and in the endgame tablebase if the game has one, instead of
+        being solved again.
+
+        :param symmetric: if True, positions that are equivalent under the
+        symmetries of the board share their entry in the transposition table
+        :return: True iff the player on turn can win
+        """
+        self.position_hash = self.position_key()
+        if symmetric:
+            self.symmetry_hashes = self.symmetric_position_keys()
+        self._start_tracking()
+        try:
+            return self._current_player_can_win_cached()
+        finally:
+            self._stop_tracking()
+            self.symmetry_hashes = None
+
+    def _current_player_can_win_cached(self, ordered: bool = False) -> bool:
+        """
+        Looks up the current position in the transposition table, and solves
+        it if it is not in there. position_hash should be up to date.
+
+        :param ordered: if True, try the moves in the order of ordered_moves
         :return: True iff the player on turn can win
         """
-        other_player = 1 - self.player_on_turn 
+        key = self.position_hash if self.symmetry_hashes is None else min(self.symmetry_hashes)
+        outcome = self.transposition_table.get(key)
+        if outcome is None and self.tablebase is not None and self.tablebase.covers(self.player_hand, self.board):
+            #The tablebase is keyed on the plain position hash, also when searching with symmetric=True
+            outcome = self.tablebase.get(self.position_hash)
+            if outcome is not None:
+                self.transposition_table.store(key, outcome)
+        if outcome is None:
+            outcome = self._current_player_can_win_search(ordered)
+            self.transposition_table.store(key, outcome)
+        return outcome
+
+    def apply_move(self, board_y: int, board_x: int, tile: typing.Tuple[int, int, int, int],
+                   rotated_tile: typing.Tuple[int, int, int, int]) -> None:
+        """
+        Plays a move in place: the player on turn places a tile from their
+        hand on the board, after which the other player is on turn. The move
+        is reverted by undo_move with the same arguments.
+
+        :param board_y: board y index to place the tile
+        :param board_x: board x index to place the tile
+        :param tile: the tile as it is stored in the hand of the player on turn
+        :param rotated_tile: the tile in the orientation it is placed in
+        """
+        if self.position_hash is not None:
+            self.position_hash ^= self.move_hash(board_y, board_x, tile, rotated_tile)
+        if self.symmetry_hashes is not None:
+            self._update_symmetry_hashes(board_y, board_x, tile, rotated_tile)
+        self.player_hand[self.player_on_turn].remove(tile)
+        self.board[board_y, board_x] = rotated_tile
+        self.player_on_turn = 1 - self.player_on_turn
+        if self.compact_board is not None:
+            self.n_occupied += 1
+            self.compact_board.place(board_y, board_x, rotated_tile)
+        if self.frontier is not None:
+            self.n_occupied += 1
+            self.frontier.discard((board_y, board_x))
+            for neighbour_y, neighbour_x in self._neighbours(board_y, board_x):
+                if self.board[neighbour_y, neighbour_x, 0] == -1:
+                    self.frontier.add((neighbour_y, neighbour_x))
+
+    def undo_move(self, board_y: int, board_x: int, tile: typing.Tuple[int, int, int, int],
+                  rotated_tile: typing.Tuple[int, int, int, int]) -> None:
+        """
+        Reverts a move played by apply_move, the tile is taken from the board
+        back into the hand of the player that played it.
+
+        :param board_y: board y index the tile was placed on
+        :param board_x: board x index the tile was placed on
+        :param tile: the tile as it is stored in the hand
+        :param rotated_tile: the tile in the orientation it was placed in
+        """
+        self.player_on_turn = 1 - self.player_on_turn
+        self.board[board_y, board_x] = -1
+        self.player_hand[self.player_on_turn].add(tile)
+        if self.compact_board is not None:
+            self.n_occupied -= 1
+            self.compact_board.clear(board_y, board_x)
+        if self.frontier is not None:
+            self.n_occupied -= 1
+            #Vacant neighbours stay in the frontier only if another tile is next to them
+            for neighbour_y, neighbour_x in self._neighbours(board_y, board_x):
+                if (self.board[neighbour_y, neighbour_x, 0] == -1 and
+                        not self._has_occupied_neighbour(neighbour_y, neighbour_x)):
+                    self.frontier.discard((neighbour_y, neighbour_x))
+            if self._has_occupied_neighbour(board_y, board_x):
+                self.frontier.add((board_y, board_x))
+        if self.position_hash is not None:
+            self.position_hash ^= self.move_hash(board_y, board_x, tile, rotated_tile)
+        if self.symmetry_hashes is not None:
+            self._update_symmetry_hashes(board_y, board_x, tile, rotated_tile)
+
+    def _current_player_can_win_search(self, ordered: bool = False) -> bool:
+        """
+        Exhaustive search of current_player_can_win, without looking up the
+        current position in the transposition table. Every move is played and
+        reverted in place with apply_move and undo_move.
 
+        :param ordered: if True, try the moves in the order of ordered_moves
+        :return: True iff the player on turn can win
+        """
+        if (self.stop_event is not None and self.nodes_searched % _STOP_CHECK_INTERVAL == 0 and
+                self.stop_event.is_set()):
+            raise SearchAborted()
+        self.nodes_searched += 1
+        if self.check_current_player_won(): #game ended, player on move has played all their tiles
+            return True
         if self.check_current_player_lost() == True: #game ended, player on move has lost
             return False
 
-        else: #game not ended, there are still possible moves
-            copy_player_hand = self.player_hand[self.player_on_turn].copy()
-
-            for location in self.adjacent_locations(): 
-                for tile in copy_player_hand:
-                    check_unique_rotation = set() #set where the unique rotations of a tile can be stored
-                    rotation_tile = self.get_rotated_tile(tile, 1)
-                    check_unique_rotation.add(rotation_tile) #adds the first 90 degree rotation of the tile to a set
-                    for rotation in range(4): 
-                        tile2 = self.get_rotated_tile(tile, rotation)
-                        check_unique_rotation.add(tile2)#adds the rotation of the tile
-                        if self.can_place_given_tile(location[0], location[1], tile2) == True: #try possible rotations of all available tiles on all adjacent locations
-                            self.player_hand[self.player_on_turn].remove(tile) 
-                            copy_board = np.copy(self.board) 
-                            player0_hand = self.player_hand[0].copy()
-                            player1_hand = self.player_hand[1].copy()
-                            self.player_hand[self.player_on_turn].add(tile)
-                            copy_game = Quatrominos(player0_hand, player1_hand, copy_board, other_player) #make a copy of the object to playout the game
-                            copy_game.board[location[0]][location[1]] = tile2 
-                            if not copy_game.current_player_can_win(): #recursively determine if the current player can win
-                                return True
-                            if len(check_unique_rotation) > 1: #checks wether a tile has unique rotations (so the rotation isn't equal to the normal tile, like 2,2,2,2)
-                                continue #if the tile isn't equal to its rotation (len(set) is bigger than 1) skip to the next rotation of the tile
-                            else:
-                                break #if the tile is equal to its rotation (len(set) is equal to 1) skip to the next tile
-            return False 
+        #The moves are listed before playing any, since playing them changes the move index
+        for board_y, board_x, tile, rotated_tile in (self.ordered_moves() if ordered else self.legal_moves()):
+            self.apply_move(board_y, board_x, tile, rotated_tile) #playout the move on this game
+            try:
+                opponent_can_win = self._current_player_can_win_cached(ordered) #recursively determine if the current player can win
+            finally:
+                #Also undone when the search is aborted, so the game is left as it was
+                self.undo_move(board_y, board_x, tile, rotated_tile)
+            if not opponent_can_win:
+                return True
+        return False
+
+    def ordered_moves(self) -> typing.List[typing.Tuple[int, int, typing.Tuple[int, int, int, int],
+                                                        typing.Tuple[int, int, int, int]]]:
+        """
+        Returns the legal_moves of the player on turn, the moves that look best
+        first: a move that plays the last tile of the hand wins at once, after
+        that the moves are ordered by the number of moves they leave the
+        opponent, like best_move_greedy.
+
+        :return: list of (y, x, tile, rotated_tile), best looking move first
+        """
+        self._start_tracking()
+        try:
+            scored_moves = list()
+            for move in self.legal_moves():
+                self.apply_move(*move)
+                opponent_hand = self.player_hand[self.player_on_turn]
+                if len(self.player_hand[1 - self.player_on_turn]) == 0 and len(opponent_hand) > 0:
+                    score = -1 #The opponent has lost
+                else:
+                    score = self.count_available_moves(opponent_hand)
+                self.undo_move(*move)
+                scored_moves.append((score, move))
+            scored_moves.sort(key=lambda scored_move: scored_move[0])
+            return [move for _, move in scored_moves]
+        finally:
+            self._stop_tracking()
+
+    def current_player_can_win_ordered(self) -> bool:
+        """
+        Determines like current_player_can_win whether the player on turn can
+        win, but tries the moves in the order of ordered_moves. The search of a
+        position stops at the first winning move, so trying the moves that
+        leave the opponent the fewest options first cuts off most of the tree.
+
+        :return: True iff the player on turn can win
+        """
+        self.position_hash = self.position_key()
+        self._start_tracking()
+        try:
+            return self._current_player_can_win_cached(ordered=True)
+        finally:
+            self._stop_tracking()
+
+    def current_player_can_win_parallel(self, n_workers: typing.Optional[int] = None, symmetric: bool = False
+                                        ) -> typing.Tuple[bool, typing.Optional[typing.Tuple[
+                                            int, int, typing.Tuple[int, int, int, int], typing.Tuple[int, int, int, int]]]]:
+        """
+        Determines like current_player_can_win whether the player on turn can
+        win, by solving the moves of the player on turn in parallel. Every
+        move of the root is a separate task for a pool of processes, tried in
+        the order of ordered_moves. As soon as one of the moves wins, the
+        other workers are stopped.
+
+        :param n_workers: the number of processes, the number of CPUs if not
+        given
+        :param symmetric: if True, only one of the moves that lead to
+        equivalent positions under the symmetries of the board is solved, and
+        the workers search like current_player_can_win with symmetric=True
+        :return: True iff the player on turn can win, and a winning move
+        (y, x, tile, rotated_tile) like in legal_moves, None if the player on
+        turn cannot win or already played all their tiles
+        """
+        if self.check_current_player_won():
+            return True, None
+        if self.check_current_player_lost():
+            return False, None
+        moves = self.ordered_moves()
+        if symmetric:
+            moves = self.distinct_moves(moves)
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        winning_move = None
+        stop_event = multiprocessing.Event()
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max(1, min(n_workers, len(moves))), initializer=_init_root_worker,
+                initargs=(stop_event, self.transposition_table.max_size)) as executor:
+            futures = {executor.submit(_solve_root_move, self.player_hand[0], self.player_hand[1],
+                                       self.board, self.player_on_turn, move, symmetric, self.compact): move
+                       for move in moves}
+            for future in concurrent.futures.as_completed(futures):
+                if future.result():
+                    winning_move = futures[future]
+                    #Tasks that did not start yet are cancelled, running ones stop at their next check
+                    stop_event.set()
+                    for other_future in futures:
+                        other_future.cancel()
+                    break
+        self.transposition_table.store(self.position_key(), winning_move is not None)
+        return winning_move is not None, winning_move
+
+    def _evaluate_proof_number_node(self, node: _ProofNumberNode, exact_tiles: int) -> None:
+        """
+        Sets the proof and disproof number of a new leaf of the proof number
+        search, for the position the game is in. Solved positions get 0 and
+        infinity, other leaves are initialized with the number of moves of the
+        player on turn: the more moves, the harder to prove they all fail.
+
+        :param node: the leaf for the current position
+        :param exact_tiles: leaves with at most this number of tiles left in
+        both hands together are solved with the depth first search
+        """
+        self.nodes_searched += 1
+        outcome = self.transposition_table.get(node.position_hash)
+        if outcome is None and self.check_current_player_won():
+            outcome = True
+        if outcome is None and self.check_current_player_lost():
+            outcome = False
+        if outcome is None and len(self.player_hand[0]) + len(self.player_hand[1]) <= exact_tiles:
+            #Near the end of the game the depth first search is cheaper than growing the tree
+            outcome = self._current_player_can_win_cached()
+        if outcome is not None:
+            #outcome tells whether the player on turn at the node wins
+            root_player_wins = outcome == node.is_or_node
+            node.proof, node.disproof = (0, float("inf")) if root_player_wins else (float("inf"), 0)
+            return
+        node.moves = self.legal_moves()
+        if node.is_or_node:
+            node.proof, node.disproof = 1, len(node.moves)
+        else:
+            node.proof, node.disproof = len(node.moves), 1
+
+    def current_player_can_win_proof_number(self, exact_tiles: int = 6) -> bool:
+        """
+        Determines like current_player_can_win whether the player on turn can
+        win, with proof number search. The search keeps the explored tree in
+        memory and always expands the most proving leaf: the leaf whose
+        outcome changes the least number of positions needed to prove or
+        disprove the win of the root. Like in PN^2 the leaves are evaluated
+        with a second search: leaves with few tiles left are solved right away
+        with the depth first search of current_player_can_win. Solved
+        positions are stored in the transposition table.
+
+        :param exact_tiles: leaves with at most this number of tiles left in
+        both hands together are solved with the depth first search
+        :return: True iff the player on turn can win
+        """
+        self.position_hash = self.position_key()
+        self._start_tracking()
+        try:
+            root = _ProofNumberNode(None, None, True, self.position_hash)
+            self._evaluate_proof_number_node(root, exact_tiles)
+            while root.proof != 0 and root.disproof != 0:
+                #Walk down to the most proving leaf, playing the moves on the way
+                node = root
+                while node.children is not None:
+                    if node.is_or_node:
+                        node = min(node.children, key=lambda child: child.proof)
+                    else:
+                        node = min(node.children, key=lambda child: child.disproof)
+                    self.apply_move(*node.move)
+
+                node.children = list()
+                for move in node.moves:
+                    self.apply_move(*move)
+                    child = _ProofNumberNode(move, node, not node.is_or_node, self.position_hash)
+                    self._evaluate_proof_number_node(child, exact_tiles)
+                    self.undo_move(*move)
+                    node.children.append(child)
+                node.moves = None
+
+                #Walk back up to the root, updating the numbers and undoing the moves
+                while node is not None:
+                    if node.is_or_node:
+                        node.proof = min(child.proof for child in node.children)
+                        node.disproof = sum(child.disproof for child in node.children)
+                    else:
+                        node.proof = sum(child.proof for child in node.children)
+                        node.disproof = min(child.disproof for child in node.children)
+                    if node.proof == 0 or node.disproof == 0:
+                        #Solved, the subtree is not needed anymore
+                        self.transposition_table.store(node.position_hash, (node.proof == 0) == node.is_or_node)
+                        node.children = list()
+                    if node.parent is not None:
+                        self.undo_move(*node.move)
+                    node = node.parent
+            return root.proof == 0
+        finally:
+            self._stop_tracking()
+
+    def evaluate(self) -> int:
+        """
+        Mobility evaluation of best_move: the number of moves of the player on
+        turn minus the number of moves of the other player. Positions where a
+        player has more options are easier to win for that player.
+
+        :return: the evaluation, from the point of view of the player on turn
+        """
+        return (self.count_available_moves(self.player_hand[self.player_on_turn]) -
+                self.count_available_moves(self.player_hand[1 - self.player_on_turn]))
+
+    def best_move(self, time_budget: float) -> typing.Optional[typing.Tuple[int, int, np.array]]:
+        """
+        Anytime search for the best move: iterative deepening alpha-beta search
+        with the mobility evaluation of evaluate at the leaves. Every iteration
+        searches one move deeper and tries the best move of the previous
+        iteration first, the scores and best moves of all iterations are kept
+        in one transposition table. The search stops when the time is up, when
+        the outcome of the game is known, or when it reached the end of the
+        game.
+
+        :param time_budget: the number of seconds to search
+        :return: A 3-tuple, containing the (y, x) coordinate of the tile, and
+        the tile in its proper orientation, like best_move_greedy, of the last
+        finished iteration. None if the game is over or the player on turn
+        has no tiles left
+        """
+        deadline = timeit.default_timer() + time_budget
+        self.position_hash = self.position_key()
+        self._start_tracking()
+        try:
+            if self.check_current_player_lost() or self.check_current_player_won():
+                return None
+            moves = self.ordered_moves()
+            best_move = moves[0] #Answer if not even the first iteration finishes
+            table = TranspositionTable()
+            max_depth = len(self.player_hand[0]) + len(self.player_hand[1])
+            for depth in range(1, max_depth + 1):
+                try:
+                    score = self._alpha_beta(depth, -float("inf"), float("inf"), table, deadline)
+                except SearchAborted:
+                    break
+                best_move = table.get(self.position_hash)[3]
+                if abs(score) >= _WIN_SCORE:
+                    break
+            return best_move[0], best_move[1], best_move[3]
+        finally:
+            self._stop_tracking()
+
+    def _alpha_beta(self, depth: int, alpha: float, beta: float, table: TranspositionTable,
+                    deadline: float) -> float:
+        """
+        Depth limited alpha-beta search of best_move, in negamax form
+
+        :param depth: the number of moves to look ahead
+        :param alpha: the score the player on turn is already sure of
+        :param beta: the score the other player is already sure of
+        :param table: maps the position hash to (depth, score, kind of score,
+        best move) of earlier searches
+        :param deadline: the value of timeit.default_timer at which the
+        search raises SearchAborted
+        :return: the score of the position for the player on turn
+        """
+        self.nodes_searched += 1
+        if timeit.default_timer() > deadline:
+            raise SearchAborted()
+        if self.check_current_player_won():
+            return _WIN_SCORE + depth #Winning sooner is better
+        if self.check_current_player_lost():
+            return -_WIN_SCORE - depth #Losing later is better
+        if depth == 0:
+            return self.evaluate()
+
+        entry = table.get(self.position_hash)
+        moves = self.legal_moves()
+        if entry is not None:
+            entry_depth, entry_score, entry_kind, entry_move = entry
+            if entry_depth >= depth:
+                if entry_kind == _EXACT:
+                    return entry_score
+                if entry_kind == _LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+            #The best move of a shallower search is likely the best move now
+            moves.remove(entry_move)
+            moves.insert(0, entry_move)
+
+        original_alpha = alpha
+        best_score, best_move = -float("inf"), None
+        for move in moves:
+            self.apply_move(*move)
+            try:
+                score = -self._alpha_beta(depth - 1, -beta, -alpha, table, deadline)
+            finally:
+                self.undo_move(*move)
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            kind = _UPPER_BOUND
+        elif best_score >= beta:
+            kind = _LOWER_BOUND
+        else:
+            kind = _EXACT
+        table.store(self.position_hash, (depth, best_score, kind, best_move))
+        return best_score
 
     def best_move_greedy(self) -> typing.Tuple[int, int, np.array]:
         """
@@ -270,6 +1589,20 @@ class Quatrominos(object):
         greedy approach would be, e.g., select the move that leaves the other
         player with the least possible amount of free moves.
 
+        :return: A 3-tuple, containing the (y, x) coordinate of the tile, and
+        the tile in its proper orientation
+        """
+        self._start_tracking()
+        try:
+            return self._best_move_greedy()
+        finally:
+            self._stop_tracking()
+
+    def _best_move_greedy(self) -> typing.Tuple[int, int, np.array]:
+        """
+        Greedy search of best_move_greedy, while the frontier is kept up to
+        date
+
         :return: A 3-tuple, containing the (y, x) coordinate of the tile, and
         the tile in its proper orientation
         """
@@ -279,17 +1612,66 @@ class Quatrominos(object):
         location_best_move = None
 
         for location in self.adjacent_locations(): 
-            for tile in self.player_hand[self.player_on_turn]:
+            for tile in tuple(self.player_hand[self.player_on_turn]):
+                rotated_tile = tile
                 for rotation in range(4):
-                    tile = self.get_rotated_tile(tile, rotation)
-                    if self.can_place_given_tile(location[0], location[1], tile) == True: #try all possible rotations of all available tiles on all adjacent locations
-                        copy_board = np.copy(self.board) 
-                        self.board[location[0]][location[1]] = tile #do move
+                    rotated_tile = self.get_rotated_tile(rotated_tile, rotation)
+                    if self.can_place_given_tile(location[0], location[1], rotated_tile) == True: #try all possible rotations of all available tiles on all adjacent locations
+                        self.apply_move(location[0], location[1], tile, rotated_tile) #do move
+                        self.nodes_searched += 1
                         moves_other_player_for_move = self.count_available_moves(self.player_hand[other_player])
+                        self.undo_move(location[0], location[1], tile, rotated_tile) #undo move
                         if moves_other_player_for_move < possible_moves_other_player: #compare available moves of the opponent with the move before
                             #move that leaves the oponnent with less possible moves
                             possible_moves_other_player = moves_other_player_for_move  
-                            tile_best_move = tile 
+                            tile_best_move = rotated_tile 
                             location_best_move = location
-                        self.board = copy_board #undo move
         return (location_best_move[0], location_best_move[1], tile_best_move) #return "best" move
+
+
+#State of a process of Quatrominos.current_player_can_win_parallel, set by _init_root_worker
+_root_worker = dict()
+
+
+def _init_root_worker(stop_event, max_size: int) -> None:
+    """
+    Initializes a process of Quatrominos.current_player_can_win_parallel. The
+    process keeps one transposition table for all the moves it solves.
+
+    :param stop_event: multiprocessing.Event that is set once a winning move
+    was found
+    :param max_size: the maximum number of positions in the transposition
+    table of the process
+    """
+    _root_worker['stop_event'] = stop_event
+    _root_worker['transposition_table'] = TranspositionTable(max_size)
+
+
+def _solve_root_move(player0: typing.Set[typing.Tuple[int, int, int, int]],
+                     player1: typing.Set[typing.Tuple[int, int, int, int]],
+                     board: np.ndarray, player_on_turn: int,
+                     move: typing.Tuple[int, int, typing.Tuple[int, int, int, int],
+                                        typing.Tuple[int, int, int, int]],
+                     symmetric: bool, compact: bool) -> typing.Optional[bool]:
+    """
+    Plays a move in the given position and determines whether it wins
+
+    :param player0: The tiles that are in the hand of player 0
+    :param player1: the tiles that are in the hand of player 1
+    :param board: the game board
+    :param player_on_turn: 0 iff player 0 is on turn, 1 otherwise
+    :param move: the move (y, x, tile, rotated_tile) of the player on turn
+    :param symmetric: passed on to current_player_can_win
+    :param compact: whether the search keeps a CompactBoard
+    :return: True iff the move wins, None if the search was stopped
+    """
+    stop_event = _root_worker['stop_event']
+    if stop_event.is_set():
+        return None
+    game_state = Quatrominos(player0, player1, board, player_on_turn, _root_worker['transposition_table'], compact)
+    game_state.stop_event = stop_event
+    game_state.apply_move(*move)
+    try:
+        return not game_state.current_player_can_win(symmetric)
+    except SearchAborted:
+        return None
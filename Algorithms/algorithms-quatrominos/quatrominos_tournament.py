@@ -0,0 +1,284 @@
+import argparse
+import concurrent.futures
+import copy
+import itertools
+import json
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+import numpy as np
+import typing
+
+from quatrominos import Quatrominos
+
+Move = typing.Tuple[int, int, typing.Tuple[int, int, int, int], typing.Tuple[int, int, int, int]]
+
+
+def _hand_move(game_state: Quatrominos, board_y: int, board_x: int,
+               rotated_tile: typing.Tuple[int, int, int, int]) -> Move:
+    """
+    Completes a move given as (y, x, rotated_tile), like best_move_greedy
+    returns it, with the tile in the hand of the player on turn it comes from
+
+    :param game_state: the game
+    :param board_y: board y index of the move
+    :param board_x: board x index of the move
+    :param rotated_tile: the tile in the orientation it is placed in
+    :return: the move (y, x, tile, rotated_tile)
+    """
+    rotated_tile = tuple(int(value) for value in rotated_tile)
+    for tile in game_state.player_hand[game_state.player_on_turn]:
+        if Quatrominos.canonical_tile(tile) == Quatrominos.canonical_tile(rotated_tile):
+            return board_y, board_x, tile, rotated_tile
+    raise ValueError('the tile %s is not in the hand of the player on turn' % (rotated_tile,))
+
+
+def greedy_engine(game_state: Quatrominos, time_budget: float) -> Move:
+    """
+    Plays the move of best_move_greedy
+
+    :param game_state: the game, the player on turn is to move
+    :param time_budget: not used
+    :return: the move (y, x, tile, rotated_tile)
+    """
+    return _hand_move(game_state, *game_state.best_move_greedy())
+
+
+def exhaustive_engine(game_state: Quatrominos, time_budget: float) -> Move:
+    """
+    Plays the first move, in the order of ordered_moves, after which the
+    opponent cannot win according to current_player_can_win. The first move
+    if no move wins.
+
+    :param game_state: the game, the player on turn is to move
+    :param time_budget: not used, the search is exhaustive
+    :return: the move (y, x, tile, rotated_tile)
+    """
+    moves = game_state.ordered_moves()
+    for move in moves:
+        game_state.apply_move(*move)
+        try:
+            opponent_can_win = game_state.current_player_can_win()
+        finally:
+            game_state.undo_move(*move)
+        if not opponent_can_win:
+            return move
+    return moves[0]
+
+
+def best_move_engine(game_state: Quatrominos, time_budget: float) -> Move:
+    """
+    Plays the move of the iterative deepening best_move
+
+    :param game_state: the game, the player on turn is to move
+    :param time_budget: the number of seconds to search per move
+    :return: the move (y, x, tile, rotated_tile)
+    """
+    return _hand_move(game_state, *game_state.best_move(time_budget))
+
+
+#The engines that can play in a tournament, a new engine only needs to be added here
+ENGINES = {
+    'greedy': greedy_engine,
+    'exhaustive': exhaustive_engine,
+    'best_move': best_move_engine,
+}
+
+
+def deal_game(board_size: int, n_tiles: int, n_numbers: int, rng: random.Random,
+              compact: bool) -> Quatrominos:
+    """
+    Deals a game with random tiles on an empty board, player 0 starts
+
+    :param board_size: the number of rows and columns of the board
+    :param n_tiles: the number of tiles of each player
+    :param n_numbers: the numbers on the tiles are 1 up to n_numbers
+    :param rng: the random generator to draw the tiles from
+    :param compact: whether the searches use a CompactBoard
+    :return: the game
+    """
+    hands = [set(), set()]
+    for hand in hands:
+        while len(hand) < n_tiles:
+            hand.add(tuple(rng.randint(1, n_numbers) for _ in range(4)))
+    board = np.full((board_size, board_size, 4), -1)
+    return Quatrominos(hands[0], hands[1], board, 0, compact=compact)
+
+
+def play_game(engines: typing.Tuple[str, str], board_size: int, n_tiles: int, n_numbers: int,
+              time_budget: float, seed: int, compact: bool,
+              trace_memory: bool = False) -> typing.Dict[str, typing.Any]:
+    """
+    Plays one game between two engines
+
+    :param engines: the names of the engines of player 0 and player 1
+    :param board_size: the number of rows and columns of the board
+    :param n_tiles: the number of tiles of each player
+    :param n_numbers: the numbers on the tiles are 1 up to n_numbers
+    :param time_budget: the number of seconds per move for engines with a
+    time budget
+    :param seed: the seed of the dealt tiles
+    :param compact: whether the searches use a CompactBoard
+    :param trace_memory: if True, every move is searched a second time with
+    tracemalloc to measure its peak memory, see traced_peak_memory
+    :return: dictionary with the winner, and the number of moves, the time
+    spent, the number of positions searched, the slowest move and the peak
+    memory (None if it was not traced) of every engine
+    """
+    game_state = deal_game(board_size, n_tiles, n_numbers, random.Random(seed), compact)
+    statistics = [{'moves': 0, 'seconds': 0.0, 'nodes': 0, 'max_latency_seconds': 0.0,
+                   'peak_memory_bytes': 0 if trace_memory else None} for _ in range(2)]
+    while not game_state.check_current_player_lost():
+        player = game_state.player_on_turn
+        nodes_before = game_state.nodes_searched
+        #The traced search starts from the same state, including the transposition table, as the timed one
+        traced_game_state = copy.deepcopy(game_state) if trace_memory else None
+        start = timeit.default_timer()
+        move = ENGINES[engines[player]](game_state, time_budget)
+        latency = timeit.default_timer() - start
+        statistics[player]['moves'] += 1
+        statistics[player]['seconds'] += latency
+        statistics[player]['nodes'] += game_state.nodes_searched - nodes_before
+        statistics[player]['max_latency_seconds'] = max(statistics[player]['max_latency_seconds'], latency)
+        if trace_memory:
+            peak_memory = traced_peak_memory(engines[player], traced_game_state, time_budget)
+            statistics[player]['peak_memory_bytes'] = max(statistics[player]['peak_memory_bytes'], peak_memory)
+        game_state.apply_move(*move)
+    return {
+        'engines': list(engines),
+        'seed': seed,
+        'winner': 1 - game_state.player_on_turn,
+        'statistics': statistics,
+    }
+
+
+def traced_peak_memory(engine: str, game_state: Quatrominos, time_budget: float) -> int:
+    """
+    Searches the move of an engine again while tracemalloc traces the
+    allocations. Tracing slows the search down, so it is kept out of the
+    timed search; engines with a time budget search fewer positions in the
+    traced search.
+
+    :param engine: the name of the engine
+    :param game_state: a copy of the game, the player on turn is to move
+    :param time_budget: the number of seconds per move for engines with a
+    time budget
+    :return: the peak number of bytes the engine allocated during the move
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        ENGINES[engine](game_state, time_budget)
+        return tracemalloc.get_traced_memory()[1] - memory_before
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def summarize(games: typing.List[typing.Dict[str, typing.Any]]) -> typing.Dict[str, typing.Any]:
+    """
+    Sums up the games per engine
+
+    :param games: the results of play_game
+    :return: dictionary from engine name to its win rate, nodes searched per
+    second, average and maximum move latency and the peak memory it allocated
+    during a move, None if the memory was not traced
+    """
+    engines = dict()
+    for game in games:
+        for player, name in enumerate(game['engines']):
+            engine = engines.setdefault(name, {'games': 0, 'wins': 0, 'moves': 0, 'seconds': 0.0, 'nodes': 0,
+                                               'max_latency_seconds': 0.0, 'peak_memory_bytes': None})
+            statistics = game['statistics'][player]
+            engine['games'] += 1
+            engine['wins'] += game['winner'] == player
+            engine['moves'] += statistics['moves']
+            engine['seconds'] += statistics['seconds']
+            engine['nodes'] += statistics['nodes']
+            engine['max_latency_seconds'] = max(engine['max_latency_seconds'], statistics['max_latency_seconds'])
+            if statistics['peak_memory_bytes'] is not None:
+                engine['peak_memory_bytes'] = max(engine['peak_memory_bytes'] or 0, statistics['peak_memory_bytes'])
+    for engine in engines.values():
+        engine['win_rate'] = engine['wins'] / engine['games']
+        engine['nodes_per_second'] = engine['nodes'] / engine['seconds'] if engine['seconds'] > 0 else 0.0
+        engine['average_move_latency_seconds'] = engine['seconds'] / engine['moves'] if engine['moves'] > 0 else 0.0
+    return engines
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    """
+    Plays every pair of engines against each other on every board size, each
+    engine starting half of the games, and writes the report as JSON
+    """
+    parser = argparse.ArgumentParser(description='Self-play tournament between Quatrominos engines')
+    parser.add_argument('--engines', type=str, nargs='+', default=['greedy', 'best_move'],
+                        choices=sorted(ENGINES), help='the engines to play the tournament with')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 7],
+                        help='the (odd) numbers of rows and columns of the boards')
+    parser.add_argument('--tiles', type=int, default=4, help='the number of tiles of each player')
+    parser.add_argument('--numbers', type=int, default=4, help='the numbers on the tiles are 1 up to this number')
+    parser.add_argument('--games', type=int, default=10,
+                        help='the number of games per pair of engines and board size')
+    parser.add_argument('--time-budget', type=float, default=0.1,
+                        help='the number of seconds per move for engines with a time budget')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of processes, the number of CPUs if not given')
+    parser.add_argument('--compact', action='store_true', help='let the searches use a CompactBoard')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='measure the peak memory of every move in a second, untimed search')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the dealt tiles')
+    parser.add_argument('--output', type=str, default=None,
+                        help='the file to write the report to, standard output if not given')
+    args = parser.parse_args(argv)
+    if any(size % 2 == 0 for size in args.sizes):
+        parser.error('the first tile is placed in the middle, so board sizes must be odd')
+
+    tasks = list()
+    for board_size in args.sizes:
+        for engine0, engine1 in itertools.combinations(args.engines, 2):
+            for game in range(args.games):
+                #Both engines play the same deal once as the starting player
+                engines = (engine0, engine1) if game % 2 == 0 else (engine1, engine0)
+                tasks.append((board_size, engines, args.seed + game // 2))
+
+    results = dict()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(play_game, engines, board_size, args.tiles, args.numbers,
+                                   args.time_budget, seed, args.compact, args.trace_memory): board_size
+                   for board_size, engines, seed in tasks}
+        for future in concurrent.futures.as_completed(futures):
+            game = future.result()
+            results.setdefault(futures[future], list()).append(game)
+            print('size: %d, %s vs %s, seed %d: player %d won' %
+                  (futures[future], game['engines'][0], game['engines'][1], game['seed'], game['winner']),
+                  file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'tiles': args.tiles,
+        'numbers': args.numbers,
+        'time_budget': args.time_budget,
+        'compact': args.compact,
+        'trace_memory': args.trace_memory,
+        'seed': args.seed,
+        'results': [{'board_size': board_size, 'games': len(results[board_size]),
+                     'engines': summarize(results[board_size])} for board_size in sorted(results)],
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
 import numpy as np
+import os
+import tempfile
+import threading
 import unittest
 
-from quatrominos import Quatrominos
+from quatrominos import CompactBoard, EndgameTablebase, Quatrominos, SearchAborted, TranspositionTable
 
 
 class TileFactory(object):
@@ -86,3 +89,354 @@ class TestQuatrominos(unittest.TestCase):
         game_state.player_on_turn = 1 #Because player 0 did his first move, player 1 is on turn
         result = game_state.current_player_can_win() # If player 1 can win then we lose
         self.assertTrue(result)#Player 1 wins as player 0 play greedy.
+
+    def test_transposition_table_evicts_least_recently_used(self):
+        table = TranspositionTable(max_size=2)
+        table.store('a', True)
+        table.store('b', False)
+        self.assertTrue(table.get('a'))
+        table.store('c', True)
+        self.assertEqual(2, len(table))
+        self.assertIsNone(table.get('b'))
+        self.assertTrue(table.get('a'))
+        self.assertTrue(table.get('c'))
+
+    def test_current_player_can_win_shared_transposition_table(self):
+        table = TranspositionTable(max_size=100)
+        game_state = GameStateFactory.get_small_board()
+        game_state.transposition_table = table
+        game_state.board[1, 0] = (4, 1, 2, 1)
+        game_state.board[1, 1] = (2, 3, 0, 1)
+        game_state.board[1, 2] = (3, 3, 3, 3)
+        board = np.copy(game_state.board)
+        self.assertTrue(game_state.current_player_can_win())
+        self.assertLessEqual(len(table), 100)
+        self.assertTrue(table.get(game_state.position_key()))
+        np.testing.assert_array_equal(board, game_state.board)
+        self.assertTrue(game_state.current_player_can_win())
+
+    def test_move_hash_matches_position_key(self):
+        game_state = GameStateFactory.get_big_board()
+        game_state.board[2, 2] = (1, 2, 2, 1)
+        game_state.player_hand[0].remove(TileFactory.tile1212)
+        game_state.player_on_turn = 1
+        position_hash = game_state.position_key()
+
+        rotated_tile = Quatrominos.get_rotated_tile(TileFactory.tile2411, 3)
+        position_hash ^= game_state.move_hash(1, 2, TileFactory.tile2411, rotated_tile)
+        game_state.board[1, 2] = rotated_tile
+        game_state.player_hand[1].remove(TileFactory.tile2411)
+        game_state.player_on_turn = 0
+        self.assertEqual(position_hash, game_state.position_key())
+        game_state.player_on_turn = 1
+        self.assertNotEqual(position_hash, game_state.position_key())
+
+    def test_apply_and_undo_move(self):
+        game_state = GameStateFactory.get_big_board()
+        game_state.board[2, 2] = (1, 2, 2, 1)
+        game_state.player_hand[0].remove(TileFactory.tile1212)
+        board = np.copy(game_state.board)
+        player1 = set(game_state.player_hand[1])
+        game_state.player_on_turn = 1
+        game_state.position_hash = position_hash = game_state.position_key()
+
+        game_state.apply_move(1, 2, TileFactory.tile2411, TileFactory.tile2411)
+        self.assertEqual(0, game_state.player_on_turn)
+        self.assertNotIn(TileFactory.tile2411, game_state.player_hand[1])
+        self.assertEqual(TileFactory.tile2411, tuple(game_state.board[1, 2]))
+        self.assertEqual(game_state.position_key(), game_state.position_hash)
+
+        game_state.undo_move(1, 2, TileFactory.tile2411, TileFactory.tile2411)
+        self.assertEqual(1, game_state.player_on_turn)
+        self.assertSetEqual(player1, game_state.player_hand[1])
+        np.testing.assert_array_equal(board, game_state.board)
+        self.assertEqual(position_hash, game_state.position_hash)
+
+    def test_frontier_kept_up_to_date(self):
+        game_state = GameStateFactory.get_big_board()
+        game_state.board[2, 2] = (1, 2, 2, 1)
+        game_state.player_hand[0].remove(TileFactory.tile1212)
+        game_state.player_on_turn = 1
+        expected_frontier = game_state.adjacent_locations()
+
+        game_state._start_tracking()
+        game_state.apply_move(1, 2, TileFactory.tile2411, TileFactory.tile2411)
+        self.assertEqual(2, game_state.n_occupied)
+        self.assertSetEqual({(0, 2), (1, 1), (1, 3), (2, 1), (2, 3), (3, 2)}, game_state.adjacent_locations())
+        game_state.undo_move(1, 2, TileFactory.tile2411, TileFactory.tile2411)
+        self.assertEqual(1, game_state.n_occupied)
+        self.assertSetEqual(expected_frontier, game_state.adjacent_locations())
+        game_state._stop_tracking()
+        self.assertIsNone(game_state.frontier)
+
+    def test_legal_moves_match_can_place_given_tile(self):
+        game_state = GameStateFactory.get_big_board()
+        game_state.board[2, 2] = (1, 2, 2, 1)
+        game_state.board[1, 2] = (2, 4, 1, 1)
+        game_state.player_hand[0].add((2, 2, 1, 1))
+        expected_moves = set()
+        for board_y, board_x in game_state.adjacent_locations():
+            for tile in game_state.player_hand[0]:
+                for rotation in range(4):
+                    rotated_tile = Quatrominos.get_rotated_tile(tile, rotation)
+                    if game_state.can_place_given_tile(board_y, board_x, rotated_tile):
+                        expected_moves.add((board_y, board_x, tile, rotated_tile))
+        expected_count = game_state.count_available_moves(game_state.player_hand[0])
+
+        legal_moves = game_state.legal_moves()
+        self.assertEqual(len(expected_moves), len(legal_moves))
+        self.assertSetEqual(expected_moves, set(legal_moves))
+        game_state._start_tracking()
+        self.assertEqual(expected_count, game_state.count_available_moves(game_state.player_hand[0]))
+        game_state._stop_tracking()
+
+    def test_ordered_and_proof_number_solvers(self):
+        def positions():
+            game_state = GameStateFactory.get_small_board()
+            game_state.board[1, 0] = (4, 1, 2, 1)
+            game_state.board[1, 1] = (2, 3, 0, 1)
+            game_state.board[1, 2] = (3, 3, 3, 3)
+            yield game_state
+            game_state = GameStateFactory.get_small_board()
+            game_state.board[1, 0] = (4, 1, 2, 1)
+            game_state.board[1, 1] = (2, 3, 0, 1)
+            game_state.board[1, 2] = (3, 3, 3, 3)
+            game_state.player_on_turn = 1
+            yield game_state
+            game_state = GameStateFactory.get_big_board()
+            game_state.board[2, 2] = (1, 2, 2, 1)
+            game_state.player_hand[0].remove(TileFactory.tile1212)
+            yield game_state
+
+        for game_state, expected_state in zip(positions(), positions()):
+            expected = expected_state.current_player_can_win()
+            board = np.copy(game_state.board)
+            hands = [set(hand) for hand in game_state.player_hand]
+            self.assertEqual(expected, game_state.current_player_can_win_ordered())
+            game_state.transposition_table.clear()
+            self.assertEqual(expected, game_state.current_player_can_win_proof_number())
+            np.testing.assert_array_equal(board, game_state.board)
+            self.assertEqual(hands, game_state.player_hand)
+
+    def test_current_player_can_win_parallel(self):
+        game_state = GameStateFactory.get_big_board()
+        game_state.board[2, 2] = (1, 2, 2, 1)
+        game_state.player_hand[0].remove(TileFactory.tile1212)
+        expected = GameStateFactory.get_big_board()
+        expected.board[2, 2] = (1, 2, 2, 1)
+        expected.player_hand[0].remove(TileFactory.tile1212)
+        expected_result = expected.current_player_can_win()
+
+        result, move = game_state.current_player_can_win_parallel(n_workers=2)
+        self.assertEqual(expected_result, result)
+        if result:
+            game_state.apply_move(*move)
+            self.assertFalse(game_state.current_player_can_win())
+        else:
+            self.assertIsNone(move)
+
+    def test_search_aborted(self):
+        game_state = GameStateFactory.get_big_board()
+        board = np.copy(game_state.board)
+        hands = [set(hand) for hand in game_state.player_hand]
+        game_state.stop_event = threading.Event()
+        game_state.stop_event.set()
+        with self.assertRaises(SearchAborted):
+            game_state.current_player_can_win()
+        np.testing.assert_array_equal(board, game_state.board)
+        self.assertEqual(hands, game_state.player_hand)
+
+    def test_canonical_form_of_symmetric_positions(self):
+        game_state = GameStateFactory.get_big_board()
+        game_state.board[2, 2] = (1, 2, 2, 1)
+        game_state.board[1, 2] = (2, 4, 1, 1)
+        game_state.player_hand[0].remove(TileFactory.tile1212)
+        game_state.player_hand[1].remove(TileFactory.tile2411)
+        height, width = game_state.board.shape[:2]
+        canonical_form = game_state.canonical_form()
+        keys = game_state.symmetric_position_keys()
+
+        for symmetry in Quatrominos.board_symmetries(height, width):
+            board = np.full(game_state.board.shape, -1)
+            for board_y, board_x in zip(*np.nonzero(game_state.board[:, :, 0] != -1)):
+                tile = tuple(int(value) for value in game_state.board[board_y, board_x])
+                image_y, image_x = Quatrominos.transform_location(board_y, board_x, height, width, symmetry)
+                board[image_y, image_x] = Quatrominos.transform_tile(tile, symmetry)
+            hands = [{Quatrominos.transform_tile(tile, (0, symmetry[1])) for tile in hand}
+                     for hand in game_state.player_hand]
+            image = Quatrominos(hands[0], hands[1], board, game_state.player_on_turn)
+            image_form = image.canonical_form()
+            np.testing.assert_array_equal(canonical_form[0], image_form[0])
+            self.assertEqual(canonical_form[1:], image_form[1:])
+            self.assertEqual(min(keys), min(image.symmetric_position_keys()))
+
+    def test_current_player_can_win_symmetric(self):
+        game_state = GameStateFactory.get_big_board()
+        expected = GameStateFactory.get_big_board().current_player_can_win()
+        self.assertEqual(expected, game_state.current_player_can_win(symmetric=True))
+        self.assertIsNone(game_state.symmetry_hashes)
+
+        game_state = GameStateFactory.get_big_board()
+        moves = game_state.legal_moves()
+        self.assertLess(len(game_state.distinct_moves(moves)), len(moves))
+        game_state.symmetry_hashes = game_state.symmetric_position_keys()
+        for move in moves:
+            game_state.apply_move(*move)
+            self.assertEqual(game_state.symmetric_position_keys(), game_state.symmetry_hashes)
+            game_state.undo_move(*move)
+        game_state.symmetry_hashes = None
+
+        result, move = GameStateFactory.get_big_board().current_player_can_win_parallel(n_workers=2, symmetric=True)
+        self.assertEqual(expected, result)
+
+    def test_compact_board_conversions(self):
+        game_state = GameStateFactory.get_big_board()
+        game_state.board[2, 2] = (1, 2, 2, 1)
+        game_state.board[1, 2] = (2, 4, 1, 1)
+        game_state.board[2, 4] = (3, 3, 3, 3)
+        compact_board = CompactBoard.from_board(game_state.board)
+        np.testing.assert_array_equal(game_state.board, compact_board.to_board())
+        self.assertEqual(game_state.adjacent_locations(), set(compact_board.frontier_locations()))
+        for board_y in range(5):
+            for board_x in range(5):
+                self.assertEqual(game_state.edge_constraint(board_y, board_x),
+                                 compact_board.edge_constraint(board_y, board_x))
+        hand = game_state.player_hand[1]
+        self.assertEqual(hand, compact_board.hand_tiles(compact_board.hand_bits(hand)))
+
+        compact_board.clear(2, 4)
+        game_state.board[2, 4] = -1
+        np.testing.assert_array_equal(game_state.board, compact_board.to_board())
+        self.assertEqual(game_state.adjacent_locations(), set(compact_board.frontier_locations()))
+
+    def test_compact_board_intern_table(self):
+        #Every board has its own ids, starting after the vacant position with the given tiles
+        tiles = [(value, value, value, value) for value in range(40000)]
+        compact_board = CompactBoard(3, 3, tiles)
+        self.assertEqual(len(tiles), compact_board.tile_id(tiles[-1]))
+        compact_board.place(1, 1, tiles[-1])
+        self.assertEqual(tiles[-1], tuple(compact_board.to_board()[1, 1]))
+        other_board = CompactBoard(3, 3)
+        self.assertEqual(1, other_board.tile_id(tiles[-1]))
+        self.assertEqual(tiles[-1], compact_board.tile(len(tiles)))
+
+    def test_current_player_can_win_compact(self):
+        for player_on_turn in range(2):
+            game_state = GameStateFactory.get_big_board()
+            game_state.player_on_turn = player_on_turn
+            expected = game_state.current_player_can_win()
+            board = np.copy(game_state.board)
+            game_state = Quatrominos(game_state.player_hand[0], game_state.player_hand[1],
+                                     game_state.board, player_on_turn, compact=True)
+            self.assertEqual(expected, game_state.current_player_can_win())
+            self.assertEqual(expected, game_state.current_player_can_win_proof_number())
+            np.testing.assert_array_equal(board, game_state.board)
+            self.assertIsNone(game_state.compact_board)
+
+    def test_best_move(self):
+        game_state = GameStateFactory.get_small_board()
+        game_state.board[1, 0] = (4, 1, 2, 1)
+        game_state.board[1, 1] = (2, 3, 0, 1)
+        game_state.board[1, 2] = (3, 3, 3, 3)
+        board = np.copy(game_state.board)
+        hands = [set(hand) for hand in game_state.player_hand]
+        #Unlike the greedy move, the move found by looking ahead wins
+        board_y, board_x, rotated_tile = game_state.best_move(time_budget=10)
+        np.testing.assert_array_equal(board, game_state.board)
+        self.assertEqual(hands, game_state.player_hand)
+        tile, = [tile for tile in game_state.player_hand[0]
+                 if Quatrominos.canonical_tile(tile) == Quatrominos.canonical_tile(rotated_tile)]
+        game_state.apply_move(board_y, board_x, tile, rotated_tile)
+        self.assertFalse(game_state.current_player_can_win())
+
+    def test_best_move_without_time(self):
+        game_state = GameStateFactory.get_big_board()
+        board_y, board_x, rotated_tile = game_state.best_move(time_budget=0)
+        self.assertTrue(game_state.can_place_given_tile(board_y, board_x, rotated_tile))
+
+    def test_best_move_empty_hand(self):
+        for compact in [False, True]:
+            board = np.full((3, 3, 4), -1)
+            game_state = Quatrominos(set(), {(1, 1, 1, 1)}, board, 0, compact=compact)
+            self.assertIsNone(game_state.best_move(time_budget=0.1))
+            board[1, 1] = (1, 1, 1, 1)
+            game_state = Quatrominos(set(), {(1, 1, 1, 1)}, board, 0, compact=compact)
+            self.assertIsNone(game_state.best_move(time_budget=0.1))
+            #Every search agrees that the player who played all their tiles has won
+            self.assertTrue(game_state.check_current_player_won())
+            self.assertFalse(game_state.check_current_player_lost())
+            self.assertTrue(game_state.current_player_can_win())
+            self.assertTrue(game_state.current_player_can_win_proof_number())
+            self.assertEqual((True, None), game_state.current_player_can_win_parallel(n_workers=1))
+
+    def test_count_available_moves_matches_can_place_given_tile(self):
+        game_state = GameStateFactory.get_big_board()
+        for move in [None, (2, 2, TileFactory.tile1212, (1, 2, 2, 1)), (1, 2, TileFactory.tile2411, (2, 4, 1, 1))]:
+            if move is not None:
+                game_state.apply_move(*move)
+            for hand in game_state.player_hand:
+                expected = sum(game_state.can_place_given_tile(board_y, board_x, Quatrominos.get_rotated_tile(tile, rotation))
+                               for board_y, board_x in game_state.adjacent_locations()
+                               for tile in hand for rotation in range(4))
+                self.assertEqual(expected, game_state.count_available_moves(hand))
+                self.assertEqual(expected, game_state.count_available_moves(np.array(list(hand))))
+        self.assertEqual(0, game_state.count_available_moves(set()))
+
+    def test_endgame_tablebase(self):
+        board = GameStateFactory.get_big_board().board
+        board[2, 2] = (1, 2, 2, 1)
+        board[1, 2] = (2, 4, 1, 1)
+        tiles = [TileFactory.tile1111, TileFactory.tile1414, TileFactory.tile2222]
+
+        with tempfile.TemporaryDirectory() as directory:
+            tablebase = EndgameTablebase.generate(os.path.join(directory, 'tablebase.npy'), board, tiles, 1,
+                                                 deal_tiles=2)
+            self.assertIsInstance(tablebase.records, np.memmap)
+            self.assertGreater(len(tablebase), 0)
+
+            player0, player1 = {TileFactory.tile1414}, {TileFactory.tile2222}
+            for player_on_turn in range(2):
+                expected = Quatrominos(set(player0), set(player1), np.copy(board), player_on_turn)
+                game_state = Quatrominos(set(player0), set(player1), np.copy(board), player_on_turn,
+                                         tablebase=tablebase)
+                self.assertEqual(expected.current_player_can_win(), tablebase.get(game_state.position_key()))
+                self.assertEqual(expected.current_player_can_win(), game_state.current_player_can_win())
+                #The outcome came from the tablebase, nothing was searched
+                self.assertEqual(0, game_state.nodes_searched)
+
+            #Positions with more tiles are not in the table, but the search looks up their subtrees
+            game_state = GameStateFactory.get_big_board()
+            game_state.board = np.copy(board)
+            game_state.player_hand = [set(tiles[:2]), {TileFactory.tile2222}]
+            expected = GameStateFactory.get_big_board()
+            expected.board = np.copy(board)
+            expected.player_hand = [set(tiles[:2]), {TileFactory.tile2222}]
+            game_state.tablebase = EndgameTablebase(tablebase.path, max_tiles=1)
+            self.assertIsNone(game_state.tablebase.get(game_state.position_key()))
+            self.assertEqual(expected.current_player_can_win(), game_state.current_player_can_win())
+            self.assertLess(game_state.nodes_searched, expected.nodes_searched)
+            del tablebase, game_state
+
+    def test_endgame_tablebase_other_board_size(self):
+        tiles = [TileFactory.tile2222, (2, 2, 2, 1)]
+        board = np.full((3, 3, 4), -1)
+        board[:, :] = TileFactory.tile2222
+        board[2, 2] = -1
+        #The same tiles on a bigger board hash the same, but the vacant positions around them change the outcome
+        big_board = np.full((5, 5, 4), -1)
+        big_board[:3, :3] = board
+
+        with tempfile.TemporaryDirectory() as directory:
+            tablebase = EndgameTablebase.generate(os.path.join(directory, 'tablebase.npy'), board, tiles, 2)
+            game_state = Quatrominos(set(tiles), {TileFactory.tile2222}, np.copy(board), 0, tablebase=tablebase)
+            self.assertTrue(tablebase.covers(game_state.player_hand, game_state.board))
+            self.assertTrue(game_state.current_player_can_win())
+            self.assertEqual(0, game_state.nodes_searched)
+
+            game_state = Quatrominos(set(tiles), {TileFactory.tile2222}, np.copy(big_board), 0, tablebase=tablebase)
+            self.assertFalse(tablebase.covers(game_state.player_hand, game_state.board))
+            self.assertFalse(game_state.current_player_can_win())
+            self.assertGreater(game_state.nodes_searched, 0)
+            #Tiles that are not in the tablebase are not looked up either
+            self.assertFalse(tablebase.covers([{(3, 3, 3, 3)}, set()], board))
+            del tablebase, game_state
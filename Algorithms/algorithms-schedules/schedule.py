@@ -1,6 +1,154 @@
 import numpy as np
 import typing
 
+
+def _count_bits(bits: int) -> int:
+    """
+    :param bits: a non-negative integer
+    :return: the number of bits set in the integer
+    """
+    return bin(bits).count("1")
+
+
+class ScheduleConstraints(object):
+
+    def __init__(self, n_weekdays: int, n_slots_day: int, n_tracks: int,
+                 courses: typing.Dict[str, typing.List[int]]):
+        """
+        Keeps track of the placed courses with bitmasks, so the rules checked
+        by Schedule.violatesrules can be checked for a single placement in
+        constant time, instead of rescanning the whole schedule. For every
+        (day, slot) a bitmask holds the tracks that have a course in that
+        slot, and for every (day, track) a bitmask holds the slots in which
+        the track has a course. The number of courses, the first and the last
+        slot of a track on a day follow from the latter.
+
+        :param n_weekdays: the number of days in the week
+        :param n_slots_day: the number of time-slots in a day
+        :param n_tracks: The number of tracks
+        :param courses: A dict of the courses, like Schedule.courses
+        """
+        self.course_tracks = {course: tuple(sorted(set(tracks))) for course, tracks in courses.items()}
+        self.course_track_mask = {course: sum(1 << track for track in tracks)
+                                  for course, tracks in self.course_tracks.items()}
+        self.slot_tracks = [[0] * n_slots_day for _ in range(n_weekdays)]
+        self.track_slots = [[0] * n_tracks for _ in range(n_weekdays)]
+
+    @classmethod
+    def from_schedule(cls, schedule: 'Schedule') -> 'ScheduleConstraints':
+        """
+        Builds the bitmasks of the courses that are in a schedule already
+
+        :param schedule: the schedule
+        :return: the constraints of the schedule
+        """
+        constraints = cls(schedule.n_weekdays, schedule.n_slots_day, schedule.n_tracks, schedule.courses)
+        for day, slot, room in zip(*np.nonzero(schedule.schedule != "")):
+            constraints.place(int(day), int(slot), str(schedule.schedule[day, slot, room]))
+        return constraints
+
+    def can_place(self, day: int, slot: int, course: str,
+                  remaining_track_courses: typing.Optional[typing.List[int]] = None) -> bool:
+        """
+        Checks whether placing a course on a slot keeps the rules of
+        Schedule.violatesrules, given that the schedule keeps them now: no
+        track gets two courses in the slot, and no track gets more than one
+        interval hour on the day.
+
+        :param day: the day to place the course on
+        :param slot: the slot to place the course on
+        :param course: the name of the course
+        :param remaining_track_courses: if given, the number of courses of
+        every track that still have to be placed, including this course. When
+        courses are not placed in the order of the slots, later courses can
+        still fill the interval hours, so only more interval hours than the
+        other remaining courses can fill violate the rule
+        :return: True if the course can be placed, False otherwise
+        """
+        if self.slot_tracks[day][slot] & self.course_track_mask[course]:
+            return False
+        track_slots = self.track_slots[day]
+        for track in self.course_tracks[course]:
+            slots = track_slots[track] | (1 << slot)
+            first_slot = (slots & -slots).bit_length() - 1
+            #The interval hours are the slots between the first and the last course without a course
+            intervals = slots.bit_length() - first_slot - _count_bits(slots)
+            if remaining_track_courses is not None:
+                intervals -= remaining_track_courses[track] - 1
+            if intervals > 1:
+                return False
+        return True
+
+    def track_can_complete(self, day: int, track: int, n_remaining: int) -> bool:
+        """
+        Checks whether the courses of a track on a day can still become valid
+        when the remaining courses of the track are placed: the interval hours
+        can be filled, and a single course on the day can get a second one.
+
+        :param day: the day to check
+        :param track: the track to check
+        :param n_remaining: the number of courses of the track that still have
+        to be placed
+        :return: False if the track can no longer get a valid day, True
+        otherwise
+        """
+        if self.count_intervals_on_day(day, track) - n_remaining > 1:
+            return False
+        return n_remaining > 0 or self.count_courses_on_day(day, track) != 1
+
+    def place(self, day: int, slot: int, course: str) -> None:
+        """
+        Registers a course placed on a slot
+
+        :param day: the day of the course
+        :param slot: the slot of the course
+        :param course: the name of the course
+        """
+        self.slot_tracks[day][slot] |= self.course_track_mask[course]
+        for track in self.course_tracks[course]:
+            self.track_slots[day][track] |= 1 << slot
+
+    def remove(self, day: int, slot: int, course: str) -> None:
+        """
+        Registers that a course placed by place is taken from its slot again
+
+        :param day: the day of the course
+        :param slot: the slot of the course
+        :param course: the name of the course
+        """
+        self.slot_tracks[day][slot] &= ~self.course_track_mask[course]
+        for track in self.course_tracks[course]:
+            self.track_slots[day][track] &= ~(1 << slot)
+
+    def count_courses_on_day(self, day: int, track: int) -> int:
+        """
+        :param day: the day to check
+        :param track: the track to check
+        :return: the number of courses of the track on the day
+        """
+        return _count_bits(self.track_slots[day][track])
+
+    def count_intervals_on_day(self, day: int, track: int) -> int:
+        """
+        :param day: the day to check
+        :param track: the track to check
+        :return: the number of interval slots of the track on the day, like
+        Schedule.count_intervals_on_day
+        """
+        slots = self.track_slots[day][track]
+        if slots == 0:
+            return 0
+        first_slot = (slots & -slots).bit_length() - 1
+        return slots.bit_length() - first_slot - _count_bits(slots)
+
+    def final_check(self) -> bool:
+        """
+        :return: True if no track has a single course on a day, like
+        Schedule.final_check
+        """
+        return all(_count_bits(slots) != 1 for track_slots in self.track_slots for slots in track_slots)
+
+
 class Schedule(object):
 
     def __init__(self, n_weekdays: int, n_slots_day: int, n_rooms: int,
@@ -27,6 +175,8 @@ class Schedule(object):
         self.n_tracks = n_tracks
         self.courses = courses
         self.schedule = np.empty(shape=(n_weekdays, n_slots_day, n_rooms), dtype=str)
+        #The constraints of the schedule while build_schedule_backtracking is running
+        self.constraints = None
 
     def print_schedule(self, track: typing.Optional[int]) -> None:
         """
@@ -183,7 +333,7 @@ class Schedule(object):
         returns: A schedule that complies with the rules mentioned above, None otherwise.
         """
         if len(courses) == 0:
-            if self.final_check() is True:
+            if self.constraints.final_check() is True:
                 return self.schedule
             else:
                 return None
@@ -202,20 +352,23 @@ class Schedule(object):
             return self._build_schedule_recursive(start_day, start_slot, start_room, courses)
 
         for course in courses:
-            self.schedule[start_day, start_slot, start_room] = course            
-            copy_courses = courses.copy()
-            copy_courses.pop(course)
+            #Only the rules of the tracks of this course on this day can become violated
+            if self.constraints.can_place(start_day, start_slot, course):
+                self.schedule[start_day, start_slot, start_room] = course
+                self.constraints.place(start_day, start_slot, course)
+                copy_courses = courses.copy()
+                copy_courses.pop(course)
 
-            if self.violatesrules() is False:
                 result = self._build_schedule_recursive(start_day, start_slot, start_room + 1, copy_courses) #Calls itself with the next room to check.
-                if type(result) is not None: #True when a schedule is returned.                
+                if result is not None: #True when a schedule is returned.
                     return result
-            self.schedule[start_day, start_slot, start_room] = ""
-            
-        if self.violatesrules() is False:
-            result2 = self._build_schedule_recursive(start_day, start_slot, start_room + 1, courses)
-            if type(result2) is not None:
-                return result2    
+                self.constraints.remove(start_day, start_slot, course)
+                self.schedule[start_day, start_slot, start_room] = ""
+
+        #Leave the room empty, the schedule did not change so it still keeps the rules
+        result2 = self._build_schedule_recursive(start_day, start_slot, start_room + 1, courses)
+        if result2 is not None:
+            return result2
         return None #Returns None because there is no schedule that doesn't violate the rules.
 
     def build_schedule_backtracking(self) -> np.array:
@@ -230,7 +383,101 @@ class Schedule(object):
 
         :return: a valid schedule if such exists, None otherwise
         """ 
-        return self._build_schedule_recursive(0, 0, 0, self.courses)
+        self.constraints = ScheduleConstraints.from_schedule(self)
+        try:
+            return self._build_schedule_recursive(0, 0, 0, self.courses)
+        finally:
+            self.constraints = None
+
+    def build_schedule_forward_checking(self) -> np.array:
+        """
+        Function that builds a schedule using backtracking with forward
+        checking. Unlike build_schedule_backtracking, the courses are the
+        variables: for every course that still has to be placed, the slots it
+        can legally go to are kept up to date, and the search backtracks as
+        soon as a course has no slot left. The course with the fewest slots
+        is placed first (the 'Most Constrained Variable' heuristic of
+        build_schedule_greedy). Rooms within a slot are interchangeable, so a
+        course is only placed in the first empty room of a slot.
+
+        :return: a valid schedule if such exists, None otherwise
+        """
+        self.constraints = ScheduleConstraints.from_schedule(self)
+        try:
+            remaining_track_courses = [0] * self.n_tracks
+            for tracks in self.constraints.course_tracks.values():
+                for track in tracks:
+                    remaining_track_courses[track] += 1
+            free_rooms = [[int(np.count_nonzero(self.schedule[day, slot] == "")) for slot in range(self.n_slots_day)]
+                          for day in range(self.n_weekdays)]
+            return self._build_schedule_forward_checking(set(self.courses), remaining_track_courses, free_rooms)
+        finally:
+            self.constraints = None
+
+    def _course_domain(self, course: str, remaining_track_courses: typing.List[int],
+                       free_rooms: typing.List[typing.List[int]]) -> typing.List[typing.Tuple[int, int]]:
+        """
+        Determines the slots a course can still be placed on
+
+        :param course: the name of the course
+        :param remaining_track_courses: the number of courses of every track
+        that still have to be placed
+        :param free_rooms: the number of empty rooms of every (day, slot)
+        :return: list of (day, slot), in the order of the schedule
+        """
+        return [(day, slot) for day in range(self.n_weekdays) for slot in range(self.n_slots_day)
+                if free_rooms[day][slot] > 0 and
+                self.constraints.can_place(day, slot, course, remaining_track_courses)]
+
+    def _build_schedule_forward_checking(
+            self, courses: typing.Set[str], remaining_track_courses: typing.List[int],
+            free_rooms: typing.List[typing.List[int]]) -> np.array:
+        """
+        Recursive search of build_schedule_forward_checking
+
+        :param courses: the names of the courses that haven't been placed in
+        the schedule yet
+        :param remaining_track_courses: the number of courses of every track
+        that haven't been placed yet
+        :param free_rooms: the number of empty rooms of every (day, slot)
+
+        returns: A schedule that complies with the rules, None otherwise.
+        """
+        if len(courses) == 0:
+            if self.constraints.final_check() is True:
+                return self.schedule
+            return None
+
+        domains = {course: self._course_domain(course, remaining_track_courses, free_rooms) for course in courses}
+        #Fewest slots first, then the course of the most tracks; the name makes the order deterministic
+        course = min(courses, key=lambda course: (len(domains[course]),
+                                                  -len(self.constraints.course_tracks[course]), course))
+        if len(domains[course]) == 0: #Some course cannot be placed anymore
+            return None
+
+        tracks = self.constraints.course_tracks[course]
+        for day, slot in domains[course]:
+            room = int(np.argmax(self.schedule[day, slot] == "")) #The first empty room
+            self.schedule[day, slot, room] = course
+            self.constraints.place(day, slot, course)
+            free_rooms[day][slot] -= 1
+            for track in tracks:
+                remaining_track_courses[track] -= 1
+
+            #Only the days of the tracks of this course can have become impossible to complete
+            if all(self.constraints.track_can_complete(check_day, track, remaining_track_courses[track])
+                   for track in tracks for check_day in range(self.n_weekdays)):
+                result = self._build_schedule_forward_checking(courses - {course}, remaining_track_courses,
+                                                               free_rooms)
+                if result is not None:
+                    return result
+
+            for track in tracks:
+                remaining_track_courses[track] += 1
+            free_rooms[day][slot] += 1
+            self.constraints.remove(day, slot, course)
+            self.schedule[day, slot, room] = ""
+        return None
 
     def build_schedule_greedy(self) -> np.array:
         """
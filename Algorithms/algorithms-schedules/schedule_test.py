@@ -2,7 +2,7 @@ import numpy as np
 import typing
 import unittest
 
-from schedule import Schedule
+from schedule import Schedule, ScheduleConstraints
 
 
 class ScheduleFactory(object):
@@ -197,3 +197,58 @@ class TestSchedule(unittest.TestCase):
         schedule = ScheduleFactory.get_schedule_impossible()
         result = schedule.build_schedule_backtracking()
         self.assertIsNone(result)
+
+    def test_constraints_match_schedule_rules(self):
+        random_state = np.random.RandomState(7)
+        schedule = ScheduleFactory.get_schedule_four_tracks_2courses()
+        constraints = ScheduleConstraints.from_schedule(schedule)
+        courses = list(schedule.courses)
+        for _ in range(200):
+            day = random_state.randint(schedule.n_weekdays)
+            slot = random_state.randint(schedule.n_slots_day)
+            room = random_state.randint(schedule.n_rooms)
+            if schedule.schedule[day, slot, room] != '':
+                constraints.remove(day, slot, schedule.schedule[day, slot, room])
+                schedule.schedule[day, slot, room] = ''
+                continue
+            course = courses[random_state.randint(len(courses))]
+            schedule.schedule[day, slot, room] = course
+            expected = not schedule.violatesrules()
+            self.assertEqual(expected, constraints.can_place(day, slot, course))
+            if expected:
+                constraints.place(day, slot, course)
+            else:
+                schedule.schedule[day, slot, room] = ''
+
+            for check_day in range(schedule.n_weekdays):
+                for track in range(schedule.n_tracks):
+                    self.assertEqual(schedule.count_courses_on_day(check_day, track),
+                                     constraints.count_courses_on_day(check_day, track))
+                    self.assertEqual(schedule.count_intervals_on_day(check_day, track),
+                                     constraints.count_intervals_on_day(check_day, track))
+            self.assertEqual(schedule.final_check(), constraints.final_check())
+
+    def test_build_schedule_forward_checking(self):
+        for get_schedule in (ScheduleFactory.get_schedule_four_tracks,
+                             ScheduleFactory.get_schedule_four_tracks_2courses):
+            schedule = get_schedule()
+            result = schedule.build_schedule_forward_checking()
+            self._check_solution(schedule, result)
+
+        schedule = ScheduleFactory.get_schedule_impossible()
+        self.assertIsNone(schedule.build_schedule_forward_checking())
+
+    def test_build_schedule_forward_checking_matches_backtracking(self):
+        random_state = np.random.RandomState(3)
+        for _ in range(30):
+            n_tracks = random_state.randint(1, 4)
+            courses = {name: sorted(set(random_state.randint(0, n_tracks, size=random_state.randint(1, 3))))
+                       for name in 'ABCDEF'[:random_state.randint(2, 7)]}
+            shape = dict(n_weekdays=random_state.randint(1, 3), n_slots_day=random_state.randint(2, 4),
+                         n_tracks=n_tracks, n_rooms=random_state.randint(1, 3), courses=courses)
+            backtracking = Schedule(**shape).build_schedule_backtracking()
+            schedule = Schedule(**shape)
+            result = schedule.build_schedule_forward_checking()
+            self.assertEqual(backtracking is None, result is None)
+            if result is not None:
+                self._check_solution(schedule, result)
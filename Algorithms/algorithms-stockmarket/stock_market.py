@@ -1,10 +1,15 @@
+import array
+import concurrent.futures
+import multiprocessing.sharedctypes
 import numpy as np
 import typing
 
 
 class StockMarket(object):
 
-    def __init__(self, b0, stock_prices: np.array, interest_factor: float):
+    def __init__(self, b0, stock_prices: np.array, interest_factor: float,
+                 memory_path: typing.Optional[str] = None, memory_dtype=float,
+                 memory_mode: str = 'w+'):
         """
         Initializes the relevant parameters
 
@@ -13,14 +18,111 @@ class StockMarket(object):
         price of stock j on day i
         :param interest_factor: The interest factor that is allocated to money
         that is on the bank (not invested in stocks)
+        :param memory_path: if given, the memory table is a numpy.memmap of
+        this file instead of an array in memory. The file is stored column by
+        column, so every day is written and read in one piece. The worth of
+        the portfolios is then computed per day instead of kept in a table.
+        :param memory_dtype: the dtype of the memory table, e.g. np.float32 to
+        halve the size of the file
+        :param memory_mode: the mode the memory file is opened in, 'w+' to
+        create it, 'r' to query a memory table that was filled before
         """
         self.b0 = b0
         self.stock_prices = stock_prices
         self.interest_factor = interest_factor
-        self.n_portfolios = 2 ** self.stock_prices.shape[0]
+        self.n_stocks = self.stock_prices.shape[0]
+        self.n_portfolios = 2 ** self.n_stocks
         self.n_days = self.stock_prices.shape[1]
-        self.memory = np.zeros(
-            shape=(self.n_portfolios, self.n_days), dtype=float)
+        self.memory_path = memory_path
+        self.memory_dtype = memory_dtype
+        if memory_path is None:
+            self.memory = None #Allocated when the full table is filled, see _allocate_memory
+        else:
+            self.memory = np.memmap(memory_path, dtype=memory_dtype, mode=memory_mode,
+                                    shape=(self.n_portfolios, self.n_days), order='F')
+        #portfolio_values[portfolio_idx, day] is the worth of the portfolio on that day, only built
+        #when the full table is filled in memory, otherwise the worth is computed when it is needed
+        self.portfolio_values = None
+        #back_pointers[day] is yesterday's portfolio that yields the budget of day
+        self.back_pointers = None
+        #sparse_memory[day] is the indices of the portfolios kept on that day in sparse mode and their
+        #budget, the memory table is not filled then. None if the memory table is used
+        self.sparse_memory = None
+        #The tables are views on these buffers, which have room for appended days
+        self._memory_buffer = self.memory
+        #The shared memory the memory buffer lies in when it was allocated for _fill_parallel, None otherwise
+        self._shared_memory = None
+        self._values_buffer = None
+        self._prices_buffer = np.asarray(self.stock_prices, dtype=float)
+        self._back_pointers_buffer = None
+
+    @classmethod
+    def open_memory(cls, memory_path: str, b0, stock_prices: np.array,
+                    interest_factor: float, memory_dtype=float) -> 'StockMarket':
+        """
+        Opens a memory table that was filled before with memory_path set, to
+        query max_gain_on_day and backtracing_portfolio straight from the
+        file, without loading it into memory.
+
+        :param memory_path: the file of the memory table
+        :param b0: The budget available on day 0
+        :param stock_prices: the stock prices the memory table was filled with
+        :param interest_factor: The interest factor that is allocated to money
+        that is on the bank (not invested in stocks)
+        :param memory_dtype: the dtype the memory table was stored in
+        :return: a StockMarket with the memory table read from the file
+        """
+        return cls(b0, stock_prices, interest_factor, memory_path=memory_path,
+                   memory_dtype=memory_dtype, memory_mode='r')
+
+    @staticmethod
+    def portfolio_worth(stock_prices: np.array) -> np.array:
+        """
+        Computes the worth of every portfolio by adding the stocks one at a
+        time: the portfolios holding stock j are the portfolios without it
+        plus its price. Every worth is the sum of its prices in the order of
+        the stocks, so the worth of a day is exactly the same whether it is
+        computed alone or as a column of the whole table.
+
+        :param stock_prices: numpy array with the prices of the stocks along
+        the first axis, e.g. the prices of one day or of all days
+        :return: numpy array with the worth of every portfolio along the first
+        axis, element [i, ...] for portfolio index i
+        """
+        stock_prices = np.asarray(stock_prices, dtype=float)
+        worth = np.zeros((1,) + stock_prices.shape[1:], dtype=float)
+        for prices in stock_prices:
+            worth = np.concatenate((worth, worth + prices))
+        return worth
+
+    @staticmethod
+    def portfolios_worth(portfolio_idxs: np.array, stock_prices: np.array) -> np.array:
+        """
+        Computes the worth of some portfolios on a day, adding the prices in
+        the order of the stocks like portfolio_worth, so the worth is exactly
+        the same as in the table of all portfolios
+
+        :param portfolio_idxs: numpy array with the indices of the portfolios
+        :param stock_prices: 1D numpy array with the price of every stock on
+        the day
+        :return: numpy array with the worth of every given portfolio
+        """
+        portfolio_idxs = np.asarray(portfolio_idxs, dtype=np.int64)
+        worth = np.zeros(portfolio_idxs.shape, dtype=float)
+        for stock_idx, price in enumerate(np.asarray(stock_prices, dtype=float)):
+            #Adding 0.0 for the stocks that are not in the portfolio does not change the sum
+            worth += np.where((portfolio_idxs >> stock_idx) & 1 == 1, price, 0.0)
+        return worth
+
+    def _build_portfolio_values(self) -> None:
+        """
+        Builds the table with the worth of every portfolio on every day, if it
+        is not built yet
+        """
+        if self._values_buffer is None:
+            self._values_buffer = self.portfolio_worth(self._prices_buffer)
+            self.portfolio_values = self._values_buffer[:, :self.n_days]
+
     @staticmethod
     def portfolio_has_stock(portfolio_idx: int, stock_idx: int) -> bool:
         """
@@ -30,11 +132,48 @@ class StockMarket(object):
         :param stock_idx: the index of the stock
         :return: true or false, whether the stock was present in the portfolio
         """
-        btsr = "{0:b}".format(portfolio_idx)
-        if len(btsr) >= stock_idx + 1:
-            if btsr[(-1*stock_idx)-1] == '1':
-                return True
-        return False
+        return (portfolio_idx >> stock_idx) & 1 == 1
+
+    @staticmethod
+    def portfolio_difference(portfolio_idx_yesterday: int,
+                             portfolio_idx_today: int) -> int:
+        """
+        Determine the stocks that are in exactly one of two portfolios, these
+        are the stocks that are traded in the transaction between them
+
+        :param portfolio_idx_yesterday: the index of yesterday's portfolio
+        :param portfolio_idx_today: the index of today's portfolio
+        :return: the portfolio index of the traded stocks
+        """
+        return portfolio_idx_yesterday ^ portfolio_idx_today
+
+    @staticmethod
+    def stocks_bought(portfolio_idx_yesterday: int,
+                      portfolio_idx_today: int) -> int:
+        """
+        Determine the stocks that are bought when going from yesterday's
+        portfolio to today's portfolio
+
+        :param portfolio_idx_yesterday: the index of yesterday's portfolio
+        :param portfolio_idx_today: the index of today's portfolio
+        :return: the portfolio index of the stocks in today's portfolio that
+        were not in yesterday's portfolio
+        """
+        return portfolio_idx_today & ~portfolio_idx_yesterday
+
+    @staticmethod
+    def stocks_sold(portfolio_idx_yesterday: int,
+                    portfolio_idx_today: int) -> int:
+        """
+        Determine the stocks that are sold when going from yesterday's
+        portfolio to today's portfolio
+
+        :param portfolio_idx_yesterday: the index of yesterday's portfolio
+        :param portfolio_idx_today: the index of today's portfolio
+        :return: the portfolio index of the stocks in yesterday's portfolio
+        that are not in today's portfolio
+        """
+        return portfolio_idx_yesterday & ~portfolio_idx_today
 
     def calculate_transaction(self, day_idx: int, portfolio_idx_yesterday: int,
                               portfolio_idx_today: int) -> float:
@@ -44,7 +183,8 @@ class StockMarket(object):
         that was in yesterdays portfolio is sold and will count positive to the
         transaction, whereas each stock that was not in yesterdays portfolio and
         is in today's portfolio was bought, and will count negatively to the
-        transaction.
+        transaction. Stocks that are in both portfolios cancel out, so the cost
+        is the difference of the worth of both portfolios today.
 
         :param day_idx: the index of today's day (note that yesterday was
         day_idx - 1)
@@ -56,49 +196,331 @@ class StockMarket(object):
         :return: the transaction cost from yesterday's portfolio to today's
         portfolio
         """
-        length_longest_portfolio = len("{0:b}".format(max(portfolio_idx_yesterday, portfolio_idx_today)))
-        #We make the representation of both portfolios the same length for easy comparison
-        portfolio_today = "{0:b}".format(portfolio_idx_today).rjust(length_longest_portfolio, '0')
-        portfolio_yesterday = "{0:b}".format(portfolio_idx_yesterday).rjust(length_longest_portfolio, '0') 
-        transaction_cost = float()
-        difference_length_stocks_portfolio = abs(len(self.stock_prices)-len(portfolio_today)) 
-        for i in range(length_longest_portfolio):
-            if portfolio_today[i] != portfolio_yesterday[i]:
-                if portfolio_today[i] == '1': #When we buy the stock
-                    transaction_cost -= self.stock_prices[(-1*i)-1-difference_length_stocks_portfolio][day_idx]  
-                elif portfolio_today[i] == '0':#When we sell the stock
-                    transaction_cost += self.stock_prices[(-1*i)-1-difference_length_stocks_portfolio][day_idx] 
-        return transaction_cost
-
-    def dynamic_programming_bottom_up(self) -> None:
-        """
-        Fills the complete memory table in a bottom up fashion.
-        """
-        for day in range(self.n_days):
-            max_liquidized_equity = -1 
-            for possible_portfolio_yesterday_idx in range(self.n_portfolios):
-                if self.memory[possible_portfolio_yesterday_idx][day-1] == -1: 
-                    continue #In this case is not possible to go from yesterdays portfolio to the portfolio looked at
-                else:  
-                    #Yesterdays budget with interest + the worth of yesterdays portfolio today 
-                    liquidized_equity = self.memory[possible_portfolio_yesterday_idx][day-1]*self.interest_factor + self.calculate_transaction(day,possible_portfolio_yesterday_idx,0) 
-                    if liquidized_equity > max_liquidized_equity: 
-                        #Store the maximum amount of budget which can be retrieved from yesterday to spend today
-                        max_liquidized_equity = liquidized_equity 
-
-            for possible_portfolio_idx in range(self.n_portfolios):
+        if self.portfolio_values is None:
+            worth_yesterday, worth_today = self.portfolios_worth(
+                [portfolio_idx_yesterday, portfolio_idx_today], self.stock_prices[:, day_idx])
+            return worth_yesterday - worth_today
+        return (self.portfolio_values[portfolio_idx_yesterday, day_idx] -
+                self.portfolio_values[portfolio_idx_today, day_idx])
+
+    def portfolio_values_on_day(self, day: int) -> np.array:
+        """
+        Returns the worth of every portfolio on a given day
+
+        :param day: The day we are interested in
+        :return: 1D numpy array with the worth of every portfolio
+        """
+        if self.portfolio_values is None:
+            return self.portfolio_worth(self.stock_prices[:, day])
+        return self.portfolio_values[:, day]
+
+    @staticmethod
+    def _liquidize(yesterday: np.array, portfolio_values: np.array,
+                   interest_factor: float) -> typing.Tuple[int, float]:
+        """
+        Determines which of yesterday's portfolios yields the maximum budget
+        when it is sold today.
+
+        :param yesterday: the memory column of yesterday
+        :param portfolio_values: the worth of every portfolio today
+        :param interest_factor: The interest factor on money on the bank
+        :return: the index of yesterday's best portfolio and the budget it
+        yields today, -1 if no portfolio was reachable yesterday
+        """
+        #Yesterdays budget with interest + the worth of yesterdays portfolio today,
+        #unreachable portfolios can not be sold today
+        liquidized_equity = np.where(yesterday != -1,
+                                     yesterday*interest_factor + portfolio_values, -np.inf)
+        best_portfolio_yesterday = int(liquidized_equity.argmax())
+        return best_portfolio_yesterday, max(liquidized_equity[best_portfolio_yesterday], -1)
+
+    @staticmethod
+    def _fill_day(yesterday: typing.Optional[np.array], portfolio_values: np.array,
+                  b0: float, interest_factor: float, today: np.array) -> int:
+        """
+        Computes the memory column of a single day from the memory column of
+        the day before, using a few array operations over all portfolios.
+
+        :param yesterday: the memory column of yesterday, None on day 0
+        :param portfolio_values: the worth of every portfolio today, selling
+        it gives this amount, buying it costs it
+        :param b0: The budget available on day 0
+        :param interest_factor: The interest factor on money on the bank
+        :param today: the array the memory column of today is written to
+        :return: the index of yesterday's portfolio that yields the maximum
+        budget to spend today (0 on day 0)
+        """
+        if yesterday is None:
+            best_portfolio_yesterday, max_liquidized_equity = 0, b0
+        else:
+            best_portfolio_yesterday, max_liquidized_equity = StockMarket._liquidize(
+                yesterday, portfolio_values, interest_factor)
+        #We can only buy the portfolios we can pay for with the liquidized equity
+        np.subtract(max_liquidized_equity, portfolio_values, out=today)
+        today[today < 0] = -1
+        return best_portfolio_yesterday
+
+    def _fill_day_sparse(self, day: int,
+                         max_liquidized_equity: float) -> typing.Tuple[np.array, np.array]:
+        """
+        Computes the memory column of a single day for the portfolios that are
+        reachable and not dominated only. Holding a stock overnight is only
+        worth it if its price tomorrow beats the interest on its price today,
+        any portfolio holding another stock is dominated by the same portfolio
+        without that stock: it holds fewer stocks and ends up with at least as
+        much money. The kept portfolios are enumerated by adding the worthwhile
+        stocks one at a time, skipping portfolios that are not affordable.
+
+        :param day: the index of the day
+        :param max_liquidized_equity: the maximum budget to spend today
+        :return: the indices of the portfolios kept today and their budget
+        """
+        prices_today = self.stock_prices[:, day]
+        if day + 1 < self.n_days:
+            gains = self.stock_prices[:, day+1] - self.interest_factor*prices_today
+            worthwhile_stocks = np.flatnonzero(gains > 0)
+        else:
+            worthwhile_stocks = [] #On the last day everything is sold
+        #Small slack so rounding in the running sums does not drop a portfolio the table can pay for
+        budget = max_liquidized_equity + 1e-9*max(1, abs(max_liquidized_equity))
+        portfolio_idxs = np.zeros(1, dtype=np.int64)
+        portfolio_worth = np.zeros(1, dtype=float)
+        for stock_idx in worthwhile_stocks:
+            extended_worth = portfolio_worth + prices_today[stock_idx]
+            affordable = extended_worth <= budget
+            portfolio_idxs = np.concatenate((portfolio_idxs, portfolio_idxs[affordable] | (1 << int(stock_idx))))
+            portfolio_worth = np.concatenate((portfolio_worth, extended_worth[affordable]))
+
+        cash = max_liquidized_equity - portfolio_worth
+        reachable = cash >= 0
+        return portfolio_idxs[reachable], cash[reachable].astype(self.memory_dtype)
+
+    def _liquidize_sparse(self, day: int) -> typing.Tuple[int, float]:
+        """
+        Determines like _liquidize which of the portfolios kept yesterday in
+        sparse mode yields the maximum budget when it is sold today
+
+        :param day: the index of today, at least 1
+        :return: the index of yesterday's best portfolio and the budget it
+        yields today, -1 if no portfolio was kept yesterday
+        """
+        portfolio_idxs, cash = self.sparse_memory[day-1]
+        if len(portfolio_idxs) == 0:
+            return 0, -1
+        liquidized_equity = cash*self.interest_factor + self.portfolios_worth(portfolio_idxs, self.stock_prices[:, day])
+        max_liquidized_equity = liquidized_equity.max()
+        #The lowest index among the best portfolios, like the full table would find
+        return int(portfolio_idxs[liquidized_equity == max_liquidized_equity].min()), max_liquidized_equity
+
+    def _allocate_memory(self, shared: bool = False) -> None:
+        """
+        Allocates the memory table in memory, with room for as many days as
+        the other buffers, if it is not allocated yet
+
+        :param shared: if True, the table is allocated in shared memory, so
+        the processes of _fill_parallel write to it directly
+        """
+        if self._memory_buffer is not None and (not shared or self._shared_memory is not None):
+            return
+        shape = (self.n_portfolios, self._prices_buffer.shape[1])
+        if shared:
+            #The array keeps the shared memory alive, it is freed with the last view on the table
+            size = shape[0] * shape[1]
+            self._shared_memory = multiprocessing.sharedctypes.RawArray(
+                'b', max(1, size * np.dtype(self.memory_dtype).itemsize))
+            self._memory_buffer = np.frombuffer(self._shared_memory, dtype=self.memory_dtype,
+                                                count=size).reshape(shape, order='F')
+        else:
+            self._shared_memory = None
+            self._memory_buffer = np.zeros(shape=shape, dtype=self.memory_dtype)
+        self.memory = self._memory_buffer[:, :self.n_days]
+
+    def _fill_parallel(self, back_pointers: np.array, n_workers: int) -> None:
+        """
+        Fills the memory table with the portfolios divided in blocks over a
+        process pool. Every day each worker writes the column of its block and
+        returns the best budget its block yields the next day, so only the
+        maximum of those has to be sent back to the workers. The workers
+        write straight into the table, which lies in shared memory (or the
+        memory file), instead of it being sent to them or copied back. The
+        worth of the portfolios a block computes for the next day is passed
+        on to the next day in shared memory as well.
+
+        :param back_pointers: the array the back pointers are written to
+        :param n_workers: the number of processes
+        """
+        if self.memory_path is None:
+            self._allocate_memory(shared=True)
+            table_location = ('shared_memory', self._shared_memory)
+        else:
+            self.memory.flush()
+            table_location = ('file', self.memory_path)
+        #The blocks are aligned to their size, a power of two, see _block_worth
+        n_blocks = min(1 << max(0, n_workers - 1).bit_length(), self.n_portfolios)
+        block_size = self.n_portfolios // n_blocks
+        blocks = [(lo, lo + block_size) for lo in range(0, self.n_portfolios, block_size)]
+        #Column day % 2 holds the worth of the portfolios on day
+        shared_worth = multiprocessing.sharedctypes.RawArray('d', 2 * self.n_portfolios)
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(n_workers, n_blocks), initializer=_init_block_worker,
+                initargs=(table_location, self._memory_buffer.shape, self._memory_buffer.dtype, shared_worth,
+                          np.asarray(self.stock_prices, dtype=float), self.interest_factor)) as executor:
+            max_liquidized_equity = self.b0
+            for day in range(self.n_days):
+                block_results = executor.map(_fill_block, [lo for lo, _ in blocks], [hi for _, hi in blocks],
+                                             [day] * n_blocks, [max_liquidized_equity] * n_blocks)
+                #Blocks are in order of portfolio index, so the first best block gives the lowest index
+                best_liquidized_equity, best_portfolio_yesterday = -np.inf, 0
+                for liquidized_equity, portfolio_idx in block_results:
+                    if liquidized_equity > best_liquidized_equity:
+                        best_liquidized_equity, best_portfolio_yesterday = liquidized_equity, portfolio_idx
+                if day + 1 < self.n_days:
+                    back_pointers[day+1] = best_portfolio_yesterday
+                    max_liquidized_equity = max(best_liquidized_equity, -1)
+
+    def dynamic_programming_bottom_up(self, store_back_pointers: bool = True,
+                                      sparse: bool = False, n_workers: int = 1) -> None:
+        """
+        Fills the complete memory table in a bottom up fashion. Each day is
+        computed with a few array operations over all portfolios at once, using
+        the precomputed worth of every portfolio on that day.
+
+        :param store_back_pointers: if True, store for every day the index of
+        yesterday's portfolio that yields the maximum budget, so
+        backtracing_portfolio does not have to recompute it
+        :param sparse: if True, only the reachable portfolios that are not
+        dominated are computed, and kept per day in sparse_memory instead of
+        the memory table, which is not filled. Neither the memory table nor
+        the worth of all portfolios is allocated in memory. The maximum
+        budgets and the backtraced portfolios are the same as with the full
+        table.
+        :param n_workers: if more than 1, every day the portfolios are divided
+        in blocks over this number of processes
+        """
+        if sparse and n_workers > 1:
+            raise ValueError("The sparse mode can not be run in parallel")
+        #Like the other buffers, the back pointers have room for the days append_day adds
+        back_pointers = np.zeros(self._prices_buffer.shape[1], dtype=np.min_scalar_type(self.n_portfolios - 1))
+        if sparse:
+            if self.memory_path is None:
+                #A table filled before no longer holds the budgets
+                self.memory = self._memory_buffer = self._shared_memory = None
+            self.sparse_memory = list()
+            for day in range(self.n_days):
                 if day == 0:
-                    remaining_budget = self.b0 + self.calculate_transaction(day,0,possible_portfolio_idx)
-                    if remaining_budget >= 0: #We can buy this portfolio
-                        self.memory[possible_portfolio_idx][day] = remaining_budget
-                    else:
-                        self.memory[possible_portfolio_idx][day] = -1 #The portfolio is not reachable with start budget
-                else: 
-                    max_remaining_budget = -1 
-                    cost_portfolio = self.calculate_transaction(day,0,possible_portfolio_idx)
-                    if max_liquidized_equity >= abs(cost_portfolio): #Can we buy the portfolio with the liquidized equity 
-                        max_remaining_budget = max_liquidized_equity + cost_portfolio
-                    self.memory[possible_portfolio_idx][day] = max_remaining_budget 
+                    max_liquidized_equity = self.b0
+                else:
+                    back_pointers[day], max_liquidized_equity = self._liquidize_sparse(day)
+                self.sparse_memory.append(self._fill_day_sparse(day, max_liquidized_equity))
+        else:
+            self.sparse_memory = None
+            if self.memory_path is None:
+                self._allocate_memory()
+        if n_workers > 1:
+            self._fill_parallel(back_pointers, n_workers)
+        elif not sparse:
+            if self.memory_path is None:
+                self._build_portfolio_values()
+            for day in range(self.n_days):
+                yesterday = self.memory[:, day-1] if day > 0 else None
+                back_pointers[day] = self._fill_day(yesterday, self.portfolio_values_on_day(day), self.b0,
+                                                    self.interest_factor, self.memory[:, day])
+        self._back_pointers_buffer = back_pointers if store_back_pointers else None
+        self.back_pointers = back_pointers[:self.n_days] if store_back_pointers else None
+
+    def _reserve_days(self, n_days: int) -> None:
+        """
+        Makes sure the day axis of the tables can hold at least n_days days.
+        The capacity is doubled when it runs out, so appending days one at a
+        time copies every column only a constant number of times on average.
+        A memory file is stored column by column, so it is extended in place.
+
+        :param n_days: the number of days the tables should be able to hold
+        """
+        capacity = self._prices_buffer.shape[1]
+        if n_days <= capacity:
+            return
+        capacity = max(n_days, 2*capacity)
+
+        def grow(buffer: np.array) -> np.array:
+            grown = np.zeros(shape=buffer.shape[:-1] + (capacity,), dtype=buffer.dtype)
+            grown[..., :self.n_days] = buffer[..., :self.n_days]
+            return grown
+
+        if self.memory_path is None:
+            if self._memory_buffer is not None:
+                self._memory_buffer = grow(self._memory_buffer)
+                self._shared_memory = None
+        else:
+            self._memory_buffer.flush()
+            self._memory_buffer = np.memmap(self.memory_path, dtype=self._memory_buffer.dtype, mode='r+',
+                                            shape=(self.n_portfolios, capacity), order='F')
+        if self._values_buffer is not None:
+            self._values_buffer = grow(self._values_buffer)
+        self._prices_buffer = grow(self._prices_buffer)
+        if self.back_pointers is not None:
+            self._back_pointers_buffer = grow(self._back_pointers_buffer)
+
+    def append_day(self, prices: np.array) -> float:
+        """
+        Adds a new day to a filled memory table, only the column of the new
+        day is computed from the last column. max_gain_on_day and
+        backtracing_portfolio take the new day into account afterwards.
+
+        :param prices: 1D numpy array with the price of every stock on the new
+        day
+        :return: The maximum budget that can be obtained on the new day
+        """
+        day = self.n_days
+        self._reserve_days(day + 1)
+        self._prices_buffer[:, day] = prices
+        if self.sparse_memory is not None:
+            return self._append_day_sparse(day)
+        if self.memory_path is None:
+            self._allocate_memory()
+        portfolio_values = self.portfolio_worth(self._prices_buffer[:, day])
+        if self._values_buffer is not None:
+            self._values_buffer[:, day] = portfolio_values
+        yesterday = self._memory_buffer[:, day-1] if day > 0 else None
+        best_portfolio_yesterday = self._fill_day(yesterday, portfolio_values, self.b0,
+                                                  self.interest_factor, self._memory_buffer[:, day])
+        if self.back_pointers is not None:
+            self._back_pointers_buffer[day] = best_portfolio_yesterday
+
+        self.n_days = day + 1
+        self.memory = self._memory_buffer[:, :self.n_days]
+        if self._values_buffer is not None:
+            self.portfolio_values = self._values_buffer[:, :self.n_days]
+        self.stock_prices = self._prices_buffer[:, :self.n_days]
+        if self.back_pointers is not None:
+            self.back_pointers = self._back_pointers_buffer[:self.n_days]
+        return self.max_gain_on_day(day)
+
+    def _append_day_sparse(self, day: int) -> float:
+        """
+        Adds a new day like append_day in sparse mode, the prices of the new
+        day are in the prices buffer already. The last day only kept the empty
+        portfolio, since everything is sold on the last day, so it is computed
+        again now that the prices of the next day are known.
+
+        :param day: the index of the new day
+        :return: The maximum budget that can be obtained on the new day
+        """
+        self.n_days = day + 1
+        self.stock_prices = self._prices_buffer[:, :self.n_days]
+        if self._values_buffer is not None:
+            self._values_buffer[:, day] = self.portfolio_worth(self._prices_buffer[:, day])
+            self.portfolio_values = self._values_buffer[:, :self.n_days]
+        if day == 0:
+            best_portfolio_yesterday, max_liquidized_equity = 0, self.b0
+        else:
+            self.sparse_memory[day-1] = self._fill_day_sparse(day-1, self.max_gain_on_day(day-1))
+            best_portfolio_yesterday, max_liquidized_equity = self._liquidize_sparse(day)
+        self.sparse_memory.append(self._fill_day_sparse(day, max_liquidized_equity))
+        if self.back_pointers is not None:
+            self._back_pointers_buffer[day] = best_portfolio_yesterday
+            self.back_pointers = self._back_pointers_buffer[:self.n_days]
+        return self.max_gain_on_day(day)
 
     def max_gain_on_day(self, day: int) -> float:
         """
@@ -106,6 +528,10 @@ class StockMarket(object):
         :param day: The day we are interested in
         :return: The maximum budget that can be obtained  
         """
+        if self.sparse_memory is not None:
+            portfolio_idxs, cash = self.sparse_memory[day]
+            #The empty portfolio comes first, it is kept whenever any portfolio is reachable
+            return cash[0] if len(portfolio_idxs) > 0 else -1
         return self.memory[0][day] #Max budget of the day is always on the top of the column 
     
     def backtracing_portfolio(self) -> typing.List[int]:
@@ -114,22 +540,252 @@ class StockMarket(object):
         Optional - you can still pass the assignment if you do not hand this in,
         however it will count towards your grade.
 
+        Uses the back pointers stored by dynamic_programming_bottom_up if
+        available, otherwise yesterday's best portfolio is determined again
+        from the memory table for every day.
+
         :return: A list ,where each index corresponds to a day and with the portfolio index as elements, containing the optimal solution.
         """
-        solution = list()
-        best_solution_idx = 0
-        solution.append(0)
-        for day in range(self.n_days-1, 0, -1):
-            #The best budget of today that can be achieved. 
-            best_solution_equity = self.memory[0][day] 
-            if day >= 1:
-                for portfolioidx in range(self.n_portfolios):
-                    budget = self.memory[portfolioidx][day-1]
-                    if budget != -1:
-                        portfolio_yesterday_worth_today = budget*self.interest_factor + self.calculate_transaction(day, portfolioidx, 0)
-                        if portfolio_yesterday_worth_today == best_solution_equity: #Yesterdays portfolio that yields the sought budget for today 
-                            solution.insert(0, portfolioidx)
-                            best_solution_idx = portfolioidx
-                            break #Break because multiple paths to the max budget of today from yesterday may exist 
-        return solution
+        if self.back_pointers is not None:
+            back_pointers = self.back_pointers
+        elif self.sparse_memory is not None:
+            back_pointers = [0] + [self._liquidize_sparse(day)[0] for day in range(1, self.n_days)]
+        else:
+            back_pointers = [0] + [self._liquidize(self.memory[:, day-1], self.portfolio_values_on_day(day),
+                                                   self.interest_factor)[0]
+                                   for day in range(1, self.n_days)]
+        #The portfolio of a day is the one the budget of the next day came from, on the last day we sell everything
+        return [int(portfolio_idx) for portfolio_idx in back_pointers[1:]] + [0]
+
+
+
+#State of a process filling blocks of the memory table, set by _init_block_worker
+_block_worker = dict()
+
+
+def _init_block_worker(table_location: typing.Tuple[str, typing.Any], shape: typing.Tuple[int, int],
+                       dtype: np.dtype, shared_worth: typing.Any, stock_prices: np.array,
+                       interest_factor: float) -> None:
+    """
+    Initializes a process of StockMarket._fill_parallel, the memory table is
+    attached from shared memory or the memory file
+
+    :param table_location: ('shared_memory', shared array) or ('file', path)
+    of the memory table
+    :param shape: the shape of the memory table
+    :param dtype: the dtype of the memory table
+    :param shared_worth: shared array with the worth of every portfolio on
+    two consecutive days
+    :param stock_prices: 2D numpy array with the stock prices
+    :param interest_factor: The interest factor on money on the bank
+    """
+    kind, location = table_location
+    if kind == 'shared_memory':
+        _block_worker['memory'] = np.frombuffer(location, dtype=dtype,
+                                                count=shape[0] * shape[1]).reshape(shape, order='F')
+    else:
+        _block_worker['memory'] = np.memmap(location, dtype=dtype, mode='r+', shape=shape, order='F')
+    _block_worker['worth'] = np.frombuffer(shared_worth, dtype=float).reshape((shape[0], 2), order='F')
+    _block_worker['stock_prices'] = stock_prices
+    _block_worker['interest_factor'] = interest_factor
+
+
+def _block_worth(lo: int, hi: int, stock_prices: np.array) -> np.array:
+    """
+    Computes the worth of the portfolios lo up to hi on a day, exactly like
+    StockMarket.portfolio_worth does for all portfolios. The block is aligned
+    to its size, a power of two, so its portfolios hold every combination of
+    the stocks of the low bits and the same stocks of the high bits. Adding
+    the prices of the high stocks to the worth of the low stocks sums the
+    prices in the order of the stocks.
+
+    :param lo: the index of the first portfolio of the block, a multiple of
+    the size of the block
+    :param hi: the index after the last portfolio of the block
+    :param stock_prices: 1D numpy array with the price of every stock on the
+    day
+    :return: numpy array with the worth of the portfolios of the block
+    """
+    n_low_stocks = (hi - lo).bit_length() - 1
+    worth = StockMarket.portfolio_worth(stock_prices[:n_low_stocks])
+    for stock_idx in range(n_low_stocks, len(stock_prices)):
+        if (lo >> stock_idx) & 1:
+            worth = worth + stock_prices[stock_idx]
+    return worth
+
+
+def _fill_block(lo: int, hi: int, day: int,
+                max_liquidized_equity: float) -> typing.Tuple[float, int]:
+    """
+    Fills the memory column of a day for the portfolios lo up to hi, and
+    determines which of them yields the maximum budget the next day. The
+    worth of the block on the next day is kept in shared memory for the
+    call of the next day, which may run in another process.
+
+    :param lo: the index of the first portfolio of the block
+    :param hi: the index after the last portfolio of the block
+    :param day: the index of the day
+    :param max_liquidized_equity: the maximum budget to spend on the day
+    :return: the best budget the block yields the next day (-inf if none of
+    the portfolios is reachable or it is the last day) and the index of the
+    portfolio that yields it
+    """
+    memory = _block_worker['memory']
+    stock_prices = _block_worker['stock_prices']
+    worth_today = _block_worker['worth'][lo:hi, day % 2]
+    if day == 0:
+        worth_today[:] = _block_worth(lo, hi, stock_prices[:, day])
+
+    today = memory[lo:hi, day]
+    #We can only buy the portfolios we can pay for with the liquidized equity, the worth is summed
+    #like the table of the serial fill, so the blocks give exactly the same memory table
+    np.subtract(max_liquidized_equity, worth_today, out=today)
+    today[today < 0] = -1
+    if day + 1 == stock_prices.shape[1]:
+        return -np.inf, lo #Last day
+    worth_tomorrow = _block_worker['worth'][lo:hi, (day+1) % 2]
+    worth_tomorrow[:] = _block_worth(lo, hi, stock_prices[:, day+1])
+    if np.all(today == -1):
+        return -np.inf, lo #No portfolio of the block is reachable
+    best_portfolio, liquidized_equity = StockMarket._liquidize(
+        today, worth_tomorrow, _block_worker['interest_factor'])
+    return liquidized_equity, lo + best_portfolio
+
+
+class StockMarketStream(object):
+
+    def __init__(self, b0, n_stocks: int, interest_factor: float):
+        """
+        Streaming variant of StockMarket, the stock prices are given one day at
+        a time and only the memory columns of yesterday and today are kept.
+        For backtracing only the maximum budget and the index of the portfolio
+        it came from are stored for every day.
+
+        :param b0: The budget available on day 0
+        :param n_stocks: The number of stocks that are traded
+        :param interest_factor: The interest factor that is allocated to money
+        that is on the bank (not invested in stocks)
+        """
+        self.b0 = b0
+        self.n_stocks = n_stocks
+        self.interest_factor = interest_factor
+        self.n_portfolios = 2 ** n_stocks
+        self.n_days = 0
+        self.yesterday = np.zeros(self.n_portfolios, dtype=float)
+        self.today = np.zeros(self.n_portfolios, dtype=float)
+        self.max_gains = array.array('d')
+        #back_pointers[day] is yesterday's portfolio that yields the budget of day
+        self.back_pointers = array.array('q')
+
+    def push_day(self, prices: np.array) -> float:
+        """
+        Computes the memory column of the next day from the memory column of
+        the day before
+
+        :param prices: 1D numpy array with the price of every stock on the day
+        :return: The maximum budget that can be obtained on that day
+        """
+        #Today's column becomes yesterday's, the old column of yesterday is overwritten
+        self.yesterday, self.today = self.today, self.yesterday
+        portfolio_values = StockMarket.portfolio_worth(prices)
+        best_portfolio_yesterday = StockMarket._fill_day(
+            self.yesterday if self.n_days > 0 else None, portfolio_values,
+            self.b0, self.interest_factor, self.today)
+        self.back_pointers.append(best_portfolio_yesterday)
+        self.max_gains.append(self.today[0])
+        self.n_days += 1
+        return self.today[0]
+
+    def consume(self, price_iterator: typing.Iterable[np.array]) -> None:
+        """
+        Pushes every day of prices given by the iterator
+
+        :param price_iterator: iterable of 1D numpy arrays, each with the price
+        of every stock on a day
+        """
+        for prices in price_iterator:
+            self.push_day(prices)
+
+    def max_gain_on_day(self, day: int) -> float:
+        """
+        Returns for a given day the maximum budget that can be obtained
+        :param day: The day we are interested in
+        :return: The maximum budget that can be obtained
+        """
+        return self.max_gains[day]
+
+    def backtracing_portfolio(self) -> typing.List[int]:
+        """Returns a sequence of portfolios how to come to the optimal solution
+
+        :return: A list ,where each index corresponds to a day and with the portfolio index as elements, containing the optimal solution.
+        """
+        if self.n_days == 0:
+            return list()
+        #The portfolio of a day is the one the budget of the next day came from, on the last day we sell everything
+        return list(self.back_pointers[1:]) + [0]
+
+
+def _max_gain_sweep(stock_prices: np.array, b0: np.array,
+                    interest_factor: np.array) -> np.array:
+    """
+    Runs the dynamic programming of StockMarket for a batch of scenarios at
+    once, keeping only the memory columns of yesterday and today.
+
+    :param stock_prices: 3D numpy array, where stock_prices[s, i, j] is the
+    price of stock i on day j in scenario s
+    :param b0: 1D numpy array with the budget on day 0 of every scenario
+    :param interest_factor: 1D numpy array with the interest factor of every
+    scenario
+    :return: 2D numpy array, where element [s, j] is the maximum budget that
+    can be obtained on day j in scenario s
+    """
+    n_scenarios, n_stocks, n_days = stock_prices.shape
+    max_gains = np.zeros(shape=(n_scenarios, n_days), dtype=float)
+    yesterday = None
+    for day in range(n_days):
+        #portfolio_values[s, p] is the worth of portfolio p today in scenario s
+        portfolio_values = StockMarket.portfolio_worth(stock_prices[:, :, day].T).T
+        if yesterday is None:
+            max_liquidized_equity = b0
+        else:
+            liquidized_equity = np.where(yesterday != -1,
+                                         yesterday*interest_factor[:, None] + portfolio_values, -np.inf)
+            max_liquidized_equity = np.maximum(liquidized_equity.max(axis=1), -1)
+        today = max_liquidized_equity[:, None] - portfolio_values
+        today[today < 0] = -1
+        max_gains[:, day] = today[:, 0]
+        yesterday = today
+    return max_gains
+
+
+def max_gain_batch(stock_prices: np.array, b0, interest_factor,
+                   n_workers: int = 1) -> np.array:
+    """
+    Determines the maximum budget on every day for a batch of scenarios, in
+    one vectorized sweep over all scenarios. With more than one worker the
+    scenarios are divided over a process pool.
+
+    :param stock_prices: 3D numpy array, where stock_prices[s, i, j] is the
+    price of stock i on day j in scenario s
+    :param b0: the budget available on day 0, either a single value or one
+    value per scenario
+    :param interest_factor: the interest factor, either a single value or one
+    value per scenario
+    :param n_workers: the number of processes to divide the scenarios over
+    :return: 2D numpy array, where element [s, j] is max_gain_on_day(j) of
+    scenario s
+    """
+    stock_prices = np.asarray(stock_prices, dtype=float)
+    n_scenarios = stock_prices.shape[0]
+    b0 = np.broadcast_to(np.asarray(b0, dtype=float), (n_scenarios,))
+    interest_factor = np.broadcast_to(np.asarray(interest_factor, dtype=float), (n_scenarios,))
+    if n_workers <= 1 or n_scenarios <= 1:
+        return _max_gain_sweep(stock_prices, b0, interest_factor)
 
+    chunks = np.array_split(np.arange(n_scenarios), min(n_workers, n_scenarios))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        results = executor.map(_max_gain_sweep,
+                               [stock_prices[chunk] for chunk in chunks],
+                               [b0[chunk] for chunk in chunks],
+                               [interest_factor[chunk] for chunk in chunks])
+        return np.concatenate(list(results), axis=0)
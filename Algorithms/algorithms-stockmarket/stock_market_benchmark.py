@@ -0,0 +1,142 @@
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+import numpy as np
+import typing
+
+from stock_market import StockMarket
+
+
+def generate_stock_prices(n_stocks: int, n_days: int,
+                          random_state: np.random.RandomState) -> np.array:
+    """
+    Generates a synthetic price matrix, every stock follows a random walk with
+    multiplicative daily returns.
+
+    :param n_stocks: the number of stocks
+    :param n_days: the number of days
+    :param random_state: the random generator to draw the returns from
+    :return: 2D numpy array, where element [i, j] is the price of stock i on
+    day j
+    """
+    start_prices = random_state.uniform(5, 50, size=(n_stocks, 1))
+    returns = random_state.normal(1.0, 0.05, size=(n_stocks, n_days - 1))
+    return np.round(start_prices * np.cumprod(np.hstack((np.ones((n_stocks, 1)), returns)), axis=1), 2)
+
+
+def time_call(function: typing.Callable[[], typing.Any], repeats: int) -> float:
+    """
+    Times a function, the best of a number of repeats is taken
+
+    :param function: the function to time, called without arguments
+    :param repeats: the number of times to call the function
+    :return: the fastest time of a single call in seconds
+    """
+    return min(timeit.repeat(function, repeat=repeats, number=1))
+
+
+def peak_memory(function: typing.Callable[[], typing.Any]) -> int:
+    """
+    Determines the peak of the memory allocated while calling a function
+
+    :param function: the function to measure, called without arguments
+    :return: the peak of the allocated memory in bytes
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_case(n_stocks: int, n_days: int, repeats: int, n_transactions: int,
+                   seed: int) -> typing.Dict[str, typing.Any]:
+    """
+    Benchmarks the StockMarket functions on one synthetic instance
+
+    :param n_stocks: the number of stocks
+    :param n_days: the number of days
+    :param repeats: the number of times each function is timed
+    :param n_transactions: the number of transactions to time
+    calculate_transaction with
+    :param seed: the seed of the random generator
+    :return: dictionary with the timings (seconds) and peak memory (bytes)
+    """
+    random_state = np.random.RandomState(seed)
+    stock_prices = generate_stock_prices(n_stocks, n_days, random_state)
+    b0 = float(stock_prices[:, 0].sum() / 2) #Enough to buy about half of the stocks
+
+    def build_and_fill():
+        stock_market = StockMarket(b0, stock_prices, 1.0001)
+        stock_market.dynamic_programming_bottom_up()
+        return stock_market
+
+    stock_market = build_and_fill()
+    days = random_state.randint(0, n_days, size=n_transactions)
+    yesterdays = random_state.randint(0, stock_market.n_portfolios, size=n_transactions)
+    todays = random_state.randint(0, stock_market.n_portfolios, size=n_transactions)
+
+    def calculate_transactions():
+        for day, yesterday, today in zip(days, yesterdays, todays):
+            stock_market.calculate_transaction(day, yesterday, today)
+
+    return {
+        'n_stocks': n_stocks,
+        'n_days': n_days,
+        'n_portfolios': stock_market.n_portfolios,
+        'dynamic_programming_bottom_up_seconds': time_call(stock_market.dynamic_programming_bottom_up, repeats),
+        'backtracing_portfolio_seconds': time_call(stock_market.backtracing_portfolio, repeats),
+        'calculate_transaction_seconds': time_call(calculate_transactions, repeats) / n_transactions,
+        'peak_memory_bytes': peak_memory(build_and_fill),
+    }
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    """
+    Runs the benchmark over a grid of stock counts and day counts and writes
+    the report as JSON
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the StockMarket dynamic programming')
+    parser.add_argument('--stocks', type=int, nargs='+', default=[2, 4, 8, 12, 16],
+                        help='the numbers of stocks to benchmark')
+    parser.add_argument('--days', type=int, nargs='+', default=[10, 100, 1000],
+                        help='the numbers of days to benchmark')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='the number of times each function is timed, the fastest time is reported')
+    parser.add_argument('--transactions', type=int, default=1000,
+                        help='the number of calls to time calculate_transaction with')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the synthetic prices')
+    parser.add_argument('--output', type=str, default=None,
+                        help='the file to write the report to, standard output if not given')
+    args = parser.parse_args(argv)
+
+    results = list()
+    for n_stocks in args.stocks:
+        for n_days in args.days:
+            results.append(benchmark_case(n_stocks, n_days, args.repeats, args.transactions, args.seed))
+            print('stocks: %d, days: %d, dynamic programming: %.4fs' %
+                  (n_stocks, n_days, results[-1]['dynamic_programming_bottom_up_seconds']), file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'repeats': args.repeats,
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 import numpy as np
+import os
+import tempfile
 import unittest
 
-from stock_market import StockMarket
+from stock_market import StockMarket, StockMarketStream, max_gain_batch
 
 
 class TestStockMarket(unittest.TestCase):
@@ -119,3 +121,245 @@ class TestStockMarket(unittest.TestCase):
 
         for idx, solution in enumerate(solutions):
             self.assertEqual(solution, test_case.max_gain_on_day(idx))
+
+    def test_portfolio_worth(self):
+        stock_prices = np.round(np.random.RandomState(23).uniform(1, 20, size=(4, 6)), 2)
+        portfolio_worth = StockMarket.portfolio_worth(stock_prices)
+        for portfolio_idx in range(16):
+            np.testing.assert_allclose(sum(stock_prices[stock_idx] for stock_idx in range(4)
+                                           if StockMarket.portfolio_has_stock(portfolio_idx, stock_idx)),
+                                       portfolio_worth[portfolio_idx])
+        for day in range(6):
+            np.testing.assert_array_equal(portfolio_worth[:, day], StockMarket.portfolio_worth(stock_prices[:, day]))
+
+    def test_many_stocks_matches_transactions(self):
+        stock_prices = np.random.RandomState(42).randint(1, 20, size=(6, 8)).astype(float)
+        test_case = StockMarket(30, stock_prices, 1.05)
+        test_case.dynamic_programming_bottom_up()
+
+        budget = 30.0
+        for day in range(test_case.n_days):
+            if day > 0:
+                budget = max(test_case.memory[portfolio, day-1]*1.05 + test_case.calculate_transaction(day, portfolio, 0)
+                             for portfolio in range(test_case.n_portfolios) if test_case.memory[portfolio, day-1] != -1)
+            for portfolio in range(test_case.n_portfolios):
+                remaining_budget = budget + test_case.calculate_transaction(day, 0, portfolio)
+                expected = remaining_budget if remaining_budget >= 0 else -1
+                self.assertAlmostEqual(expected, test_case.memory[portfolio, day])
+
+    def test_bought_and_sold_stocks(self):
+        for yesterday in range(16):
+            for today in range(16):
+                bought = StockMarket.stocks_bought(yesterday, today)
+                sold = StockMarket.stocks_sold(yesterday, today)
+                self.assertEqual(StockMarket.portfolio_difference(yesterday, today), bought | sold)
+                for stock_idx in range(4):
+                    in_yesterday = StockMarket.portfolio_has_stock(yesterday, stock_idx)
+                    in_today = StockMarket.portfolio_has_stock(today, stock_idx)
+                    self.assertEqual(in_today and not in_yesterday, StockMarket.portfolio_has_stock(bought, stock_idx))
+                    self.assertEqual(in_yesterday and not in_today, StockMarket.portfolio_has_stock(sold, stock_idx))
+
+    def test_stream_matches_table(self):
+        stock_prices = np.array([
+            [10, 15, 20, 15, 10],
+            [5,  15, 10, 15, 20],
+            [30, 25, 20, 25, 30],
+            [10,  15, 30, 35, 40],
+        ], dtype=float)
+        test_case = StockMarket(5, stock_prices, 1.0)
+        test_case.dynamic_programming_bottom_up()
+        stream = StockMarketStream(5, 4, 1.0)
+        stream.consume(stock_prices.T)
+
+        self.assertEqual(5, stream.n_days)
+        for day in range(5):
+            self.assertEqual(test_case.max_gain_on_day(day), stream.max_gain_on_day(day))
+        self.assertEqual(test_case.backtracing_portfolio(), stream.backtracing_portfolio())
+
+    def test_stream_matches_table_decimal_prices(self):
+        random_state = np.random.RandomState(19)
+        for _ in range(20):
+            stock_prices = np.round(random_state.uniform(1, 20, size=(5, 8)), 2)
+            stock_prices[0] = stock_prices[0, 0] #A flat stock makes portfolios tie
+            test_case = StockMarket(30, stock_prices, 1.0)
+            test_case.dynamic_programming_bottom_up()
+            stream = StockMarketStream(30, 5, 1.0)
+            stream.consume(stock_prices.T)
+
+            for day in range(8):
+                self.assertEqual(test_case.max_gain_on_day(day), stream.max_gain_on_day(day))
+            self.assertEqual(test_case.backtracing_portfolio(), stream.backtracing_portfolio())
+
+    def test_stream_single_stock_optimal_portfolio(self):
+        stream = StockMarketStream(5, 1, 1.0)
+        for prices in [[5], [1], [10]]:
+            stream.push_day(np.array(prices, dtype=float))
+        self.assertEqual([5.0, 5.0, 14.0], list(stream.max_gains))
+        self.assertEqual([0, 1, 0], stream.backtracing_portfolio())
+
+    def test_backtracing_without_back_pointers(self):
+        stock_prices = np.random.RandomState(7).randint(1, 20, size=(5, 10)).astype(float)
+        test_case = StockMarket(25, stock_prices, 1.02)
+        test_case.dynamic_programming_bottom_up()
+        self.assertEqual(10, len(test_case.back_pointers))
+        solution = test_case.backtracing_portfolio()
+
+        test_case.dynamic_programming_bottom_up(store_back_pointers=False)
+        self.assertIsNone(test_case.back_pointers)
+        self.assertEqual(solution, test_case.backtracing_portfolio())
+
+    def test_max_gain_batch(self):
+        random_state = np.random.RandomState(3)
+        stock_prices = random_state.randint(1, 20, size=(6, 4, 7)).astype(float)
+        b0 = random_state.randint(0, 30, size=6).astype(float)
+        interest_factor = np.array([1.0, 1.1, 0.9, 1.0, 2.0, 1.05])
+
+        for n_workers in [1, 2]:
+            max_gains = max_gain_batch(stock_prices, b0, interest_factor, n_workers=n_workers)
+            self.assertEqual((6, 7), max_gains.shape)
+            for scenario in range(6):
+                test_case = StockMarket(b0[scenario], stock_prices[scenario], interest_factor[scenario])
+                test_case.dynamic_programming_bottom_up()
+                for day in range(7):
+                    self.assertAlmostEqual(test_case.max_gain_on_day(day), max_gains[scenario, day])
+
+    def test_append_day(self):
+        stock_prices = np.random.RandomState(11).randint(1, 20, size=(4, 9)).astype(float)
+        test_case = StockMarket(20, stock_prices, 1.01)
+        test_case.dynamic_programming_bottom_up()
+        appended_case = StockMarket(20, stock_prices[:, :3], 1.01)
+        appended_case.dynamic_programming_bottom_up()
+        for day in range(3, 9):
+            self.assertEqual(test_case.max_gain_on_day(day), appended_case.append_day(stock_prices[:, day]))
+
+        self.assertEqual(9, appended_case.n_days)
+        np.testing.assert_array_equal(stock_prices, appended_case.stock_prices)
+        np.testing.assert_array_equal(test_case.memory, appended_case.memory)
+        self.assertEqual(test_case.backtracing_portfolio(), appended_case.backtracing_portfolio())
+
+    def test_append_day_after_filling_again(self):
+        stock_prices = np.random.RandomState(13).randint(1, 20, size=(4, 9)).astype(float)
+        test_case = StockMarket(20, stock_prices, 1.01)
+        test_case.dynamic_programming_bottom_up()
+        for store_back_pointers in [True, False]:
+            appended_case = StockMarket(20, stock_prices[:, :3], 1.01)
+            appended_case.dynamic_programming_bottom_up(store_back_pointers=store_back_pointers)
+            #Filling the table again after appending a day keeps the room the tables have for appended days
+            for day in range(3, 9):
+                appended_case.append_day(stock_prices[:, day])
+                appended_case.dynamic_programming_bottom_up()
+                self.assertEqual(test_case.max_gain_on_day(day), appended_case.max_gain_on_day(day))
+            np.testing.assert_array_equal(test_case.memory, appended_case.memory)
+            np.testing.assert_array_equal(test_case.back_pointers, appended_case.back_pointers)
+            self.assertEqual(test_case.backtracing_portfolio(), appended_case.backtracing_portfolio())
+
+    def test_sparse_matches_full_table(self):
+        random_state = np.random.RandomState(5)
+        for b0 in [3, 10, 40]:
+            stock_prices = random_state.randint(1, 20, size=(6, 8)).astype(float)
+            full_case = StockMarket(b0, stock_prices, 1.02)
+            full_case.dynamic_programming_bottom_up()
+            sparse_case = StockMarket(b0, stock_prices, 1.02)
+            sparse_case.dynamic_programming_bottom_up(sparse=True)
+
+            for day in range(8):
+                self.assertAlmostEqual(full_case.max_gain_on_day(day), sparse_case.max_gain_on_day(day))
+            self.assertEqual(full_case.backtracing_portfolio(), sparse_case.backtracing_portfolio())
+            #Only the kept portfolios are stored, with the budget of the full table
+            self.assertIsNone(sparse_case.memory)
+            for day, (portfolio_idxs, cash) in enumerate(sparse_case.sparse_memory):
+                np.testing.assert_allclose(full_case.memory[portfolio_idxs, day], cash)
+
+            for day in range(3):
+                sparse_case.append_day(stock_prices[:, day])
+                full_case.append_day(stock_prices[:, day])
+                self.assertAlmostEqual(full_case.max_gain_on_day(8 + day), sparse_case.max_gain_on_day(8 + day))
+            self.assertIsNone(sparse_case.memory)
+            self.assertEqual(full_case.backtracing_portfolio(), sparse_case.backtracing_portfolio())
+            sparse_case.back_pointers = None
+            self.assertEqual(full_case.backtracing_portfolio(), sparse_case.backtracing_portfolio())
+
+    def test_sparse_without_value_table(self):
+        random_state = np.random.RandomState(7)
+        for _ in range(10):
+            stock_prices = np.round(random_state.uniform(1, 20, size=(6, 8)), 2)
+            full_case = StockMarket(30, stock_prices, 1.01)
+            full_case.dynamic_programming_bottom_up()
+            sparse_case = StockMarket(30, stock_prices, 1.01)
+            sparse_case.dynamic_programming_bottom_up(sparse=True)
+            #The worth of the kept portfolios is exactly the worth in the table
+            self.assertIsNone(sparse_case.portfolio_values)
+            self.assertEqual([full_case.max_gain_on_day(day) for day in range(8)],
+                             [sparse_case.max_gain_on_day(day) for day in range(8)])
+            self.assertEqual(full_case.backtracing_portfolio(), sparse_case.backtracing_portfolio())
+            for portfolio_idx_yesterday, portfolio_idx_today in [(0, 63), (5, 18), (42, 42)]:
+                self.assertEqual(full_case.calculate_transaction(3, portfolio_idx_yesterday, portfolio_idx_today),
+                                 sparse_case.calculate_transaction(3, portfolio_idx_yesterday, portfolio_idx_today))
+
+    def test_sparse_tight_budget(self):
+        stock_prices = np.array([
+            [10, 15, 20, 15, 10],
+            [5,  15, 10, 15, 20],
+            [30, 25, 20, 25, 30],
+            [10,  15, 30, 35, 40],
+        ], dtype=float)
+        test_case = StockMarket(5, stock_prices, 1.0)
+        test_case.dynamic_programming_bottom_up(sparse=True)
+        self.assertEqual([5.0, 15.0, 30.0, 40.0, 50.0], [test_case.max_gain_on_day(day) for day in range(5)])
+        self.assertLessEqual(len(test_case.sparse_memory[0][0]), 2)
+
+    def test_memory_file(self):
+        stock_prices = np.random.RandomState(13).randint(1, 20, size=(5, 7)).astype(float)
+        test_case = StockMarket(25, stock_prices, 1.0)
+        test_case.dynamic_programming_bottom_up()
+
+        with tempfile.TemporaryDirectory() as directory:
+            memory_path = os.path.join(directory, 'memory.dat')
+            file_case = StockMarket(25, stock_prices, 1.0, memory_path=memory_path, memory_dtype=np.float32)
+            file_case.dynamic_programming_bottom_up()
+            self.assertIsInstance(file_case.memory, np.memmap)
+            self.assertEqual(stock_prices[0, 0], file_case.calculate_transaction(0, 1, 0))
+            self.assertAlmostEqual(test_case.append_day(stock_prices[:, 0]), file_case.append_day(stock_prices[:, 0]), places=4)
+            file_case.memory.flush()
+            del file_case
+
+            reopened_case = StockMarket.open_memory(memory_path, 25, test_case.stock_prices, 1.0, memory_dtype=np.float32)
+            for day in range(8):
+                self.assertAlmostEqual(test_case.max_gain_on_day(day), reopened_case.max_gain_on_day(day), places=4)
+            self.assertEqual(test_case.backtracing_portfolio(), reopened_case.backtracing_portfolio())
+            del reopened_case
+
+    def test_parallel_matches_serial(self):
+        stock_prices = np.random.RandomState(17).randint(1, 20, size=(7, 6)).astype(float)
+        serial_case = StockMarket(30, stock_prices, 1.03)
+        serial_case.dynamic_programming_bottom_up()
+        parallel_case = StockMarket(30, stock_prices, 1.03)
+        parallel_case.dynamic_programming_bottom_up(n_workers=3)
+
+        np.testing.assert_array_equal(serial_case.memory, parallel_case.memory)
+        np.testing.assert_array_equal(serial_case.back_pointers, parallel_case.back_pointers)
+        with self.assertRaises(ValueError):
+            parallel_case.dynamic_programming_bottom_up(sparse=True, n_workers=3)
+
+    def test_parallel_matches_serial_decimal_prices(self):
+        random_state = np.random.RandomState(23)
+        for _ in range(3):
+            stock_prices = np.round(random_state.uniform(1, 20, size=(8, 10)), 2)
+            stock_prices[0] = stock_prices[0, 0] #A flat stock makes many portfolios tie
+            serial_case = StockMarket(60, stock_prices, 1.0)
+            serial_case.dynamic_programming_bottom_up()
+            parallel_case = StockMarket(60, stock_prices, 1.0)
+            parallel_case.dynamic_programming_bottom_up(n_workers=3)
+
+            np.testing.assert_array_equal(serial_case.memory, parallel_case.memory)
+            np.testing.assert_array_equal(serial_case.back_pointers, parallel_case.back_pointers)
+            self.assertEqual(serial_case.backtracing_portfolio(), parallel_case.backtracing_portfolio())
+
+            #The tables of appended days have room for more days
+            appended_case = StockMarket(60, stock_prices[:, :4], 1.0)
+            appended_case.dynamic_programming_bottom_up()
+            for day in range(4, 10):
+                appended_case.append_day(stock_prices[:, day])
+            appended_case.dynamic_programming_bottom_up(n_workers=2)
+            np.testing.assert_array_equal(serial_case.memory, appended_case.memory)
+            np.testing.assert_array_equal(serial_case.back_pointers, appended_case.back_pointers)